@@ -0,0 +1,285 @@
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import os
+
+import numpy as np
+
+from cache import TTLCache
+
+# Users whose analytics are kept, and how long, so writes made through
+# other workers show up without an explicit invalidation
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "2000"))
+ANALYTICS_CACHE_MAX_AGE = float(os.getenv("ANALYTICS_CACHE_MAX_AGE", "300"))
+# (window, trend, points) variants kept per user, least recently used
+# dropped first; the charts tab asks for a new one whenever it is resized
+ANALYTICS_VARIANTS_PER_USER = int(os.getenv("ANALYTICS_VARIANTS_PER_USER", "8"))
+
+TREND_METHODS = ("linear", "robust")
+# Theil-Sen looks at every pair of points; beyond this many points it runs
+# on an evenly spaced subsample
+MAX_ROBUST_POINTS = 1500
+
+def _days(dates: Sequence[date]) -> np.ndarray:
+    return np.array(dates, dtype="datetime64[D]")
+
+def _iso(days: np.ndarray) -> List[str]:
+    return np.datetime_as_string(days, unit="D").tolist()
+
+def _rounded(values: np.ndarray, digits: int = 2) -> List[Optional[float]]:
+    # NaN (an empty bucket) becomes null in the JSON
+    rounded = np.round(values, digits)
+    return [None if value != value else value for value in rounded.tolist()]
+
+def rolling_mean(days: np.ndarray, values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Mean of the samples in the window days ending at each sample, for
+    irregularly spaced samples sorted by day.
+    """
+    ordinals = days.astype(np.int64)
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    first = np.searchsorted(ordinals, ordinals - window + 1, side="left")
+    last = np.arange(1, len(values) + 1)
+    return (sums[last] - sums[first]) / (last - first)
+
+def _bucket_edges(size: int, points: int) -> np.ndarray:
+    # points - 2 buckets over the interior samples; the ends are kept as is
+    return np.linspace(1, size - 1, points - 1).astype(np.int64)
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """
+    Indices of the samples Largest-Triangle-Three-Buckets keeps to draw y
+    against x with `points` points: the first and last sample, and from each
+    bucket in between the one forming the largest triangle with the point
+    kept before it and the mean of the next bucket.
+    """
+    size = len(x)
+    if points >= size or points < 3:
+        return np.arange(size)
+    edges = _bucket_edges(size, points)
+    starts, ends = edges[:-1], edges[1:]
+    counts = ends - starts
+    # Mean of every bucket, then the last sample standing in for the bucket
+    # after the final one. reduceat runs its last segment to the end of the
+    # array, so leave the last sample out of the final bucket's sum.
+    mean_x = np.append(np.add.reduceat(x[:-1], starts) / counts, x[-1])
+    mean_y = np.append(np.add.reduceat(y[:-1], starts) / counts, y[-1])
+
+    kept = np.empty(points, dtype=np.int64)
+    kept[0], kept[-1] = 0, size - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, end = starts[bucket], ends[bucket]
+        ax, ay = x[previous], y[previous]
+        bx, by = mean_x[bucket + 1], mean_y[bucket + 1]
+        areas = np.abs((ax - bx) * (y[start:end] - ay) - (ax - x[start:end]) * (by - ay))
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
+
+def envelope(y: np.ndarray, points: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Minimum and maximum of y over the same buckets lttb() uses, so spikes
+    the kept points skip still show as a band around the line.
+    """
+    size = len(y)
+    if points >= size or points < 3:
+        return y, y
+    starts = _bucket_edges(size, points)[:-1]
+    lows = np.concatenate(([y[0]], np.minimum.reduceat(y[:-1], starts), [y[-1]]))
+    highs = np.concatenate(([y[0]], np.maximum.reduceat(y[:-1], starts), [y[-1]]))
+    return lows, highs
+
+def downsample(days: np.ndarray, columns: Dict[str, np.ndarray], key: str, points: Optional[int]):
+    """
+    Cut a date series to `points` samples chosen by LTTB on columns[key].
+    Every column keeps the same samples; key gains _min and _max envelopes.
+    """
+    if not points or points >= len(days):
+        return days, columns
+    kept = lttb(days.astype(np.float64), columns[key], points)
+    lows, highs = envelope(columns[key], points)
+    result = {name: values[kept] for name, values in columns.items()}
+    result[f"{key}_min"], result[f"{key}_max"] = lows, highs
+    return days[kept], result
+
+def downsample_rows(rows: List[Dict[str, Any]], key: str, points: Optional[int]) -> List[Dict[str, Any]]:
+    """
+    The rows LTTB keeps from a date-ordered list, for endpoints returning
+    whole rows. Each kept row gains key_min and key_max over its bucket.
+    """
+    if not points or points >= len(rows):
+        return rows
+    x = _days([row["date"] for row in rows]).astype(np.float64)
+    values = np.array([row[key] for row in rows])
+    kept = lttb(x, values.astype(np.float64), points)
+    lows, highs = envelope(values, points)
+    return [
+        {**rows[index], f"{key}_min": low, f"{key}_max": high}
+        for index, low, high in zip(kept.tolist(), lows.tolist(), highs.tolist())
+    ]
+
+def period_means(periods: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # periods holds each sample's week or month start
+    starts, inverse = np.unique(periods, return_inverse=True)
+    sums = np.bincount(inverse, weights=values, minlength=len(starts))
+    return starts, sums / np.bincount(inverse, minlength=len(starts))
+
+def aligned_periods(series: Dict[str, Tuple[np.ndarray, np.ndarray]]) -> Dict[str, Any]:
+    # One row per period present in any series, null where a series has no samples
+    starts = np.unique(np.concatenate([periods for periods, _ in series.values()]))
+    result: Dict[str, Any] = {"start": _iso(starts.astype("datetime64[D]"))}
+    for name, (periods, values) in series.items():
+        period_starts, means = period_means(periods, values)
+        column = np.full(len(starts), np.nan)
+        column[np.searchsorted(starts, period_starts)] = means
+        result[name] = _rounded(column)
+    return result
+
+def week_starts(days: np.ndarray) -> np.ndarray:
+    # 1970-01-01 was a Thursday; shift so weeks start on Monday
+    ordinals = days.astype(np.int64)
+    return (ordinals - (ordinals + 3) % 7).astype("datetime64[D]")
+
+def fit_trend(x: np.ndarray, y: np.ndarray, method: str = "linear") -> Tuple[float, float]:
+    """
+    Slope and intercept of y against x. "robust" is the Theil-Sen estimator,
+    the median of pairwise slopes, which a few mistyped weigh-ins cannot drag.
+    """
+    if len(x) < 2 or x[0] == x[-1]:
+        return 0.0, float(np.mean(y)) if len(y) else 0.0
+    if method == "robust":
+        if len(x) > MAX_ROBUST_POINTS:
+            keep = np.linspace(0, len(x) - 1, MAX_ROBUST_POINTS).astype(np.int64)
+            x, y = x[keep], y[keep]
+        i, j = np.triu_indices(len(x), k=1)
+        dx = x[j] - x[i]
+        distinct = dx != 0
+        slope = float(np.median((y[j] - y[i])[distinct] / dx[distinct]))
+        return slope, float(np.median(y - slope * x))
+    slope, intercept = np.polyfit(x, y, 1)
+    return float(slope), float(intercept)
+
+def progress_analytics(
+    progress: Dict[str, list],
+    daily: Dict[str, list],
+    window: int = 7,
+    trend: str = "linear",
+    points: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Chart-ready series from a user's progress entries and daily nutrition
+    totals, both given as column lists sorted by date. Every series is
+    column oriented: one list of dates and one list per value. With points,
+    the daily series are downsampled with LTTB and carry min/max envelopes.
+    """
+    days = _days(progress["date"])
+    weight = np.asarray(progress["weight"], dtype=np.float64)
+    bmi = np.asarray(progress["bmi"], dtype=np.float64)
+    intake = np.asarray(progress["calorie_intake"], dtype=np.float64)
+    calorie_days = _days(daily["date"])
+    calories = np.asarray(daily["calories"], dtype=np.float64)
+
+    # Rolling means use every sample; only what is sent gets downsampled
+    progress_days, progress_columns = downsample(days, {
+        "weight": weight,
+        "bmi": bmi,
+        "calorie_intake": intake,
+        "weight_rolling": rolling_mean(days, weight, window),
+    }, "weight", points)
+    daily_days, daily_columns = downsample(calorie_days, {
+        "calories": calories,
+        "rolling": rolling_mean(calorie_days, calories, window),
+    }, "calories", points)
+
+    result: Dict[str, Any] = {
+        "window": window,
+        "points": points,
+        "progress": {"date": _iso(progress_days), **{
+            name: _rounded(values, 0 if name == "calorie_intake" else 2) for name, values in progress_columns.items()
+        }},
+        "calories": {"date": _iso(daily_days), **{
+            name: _rounded(values, 0) for name, values in daily_columns.items()
+        }},
+    }
+
+    result["weekly"] = aligned_periods({
+        "weight": (week_starts(days), weight),
+        "calories": (week_starts(calorie_days), calories),
+    })
+    result["monthly"] = aligned_periods({
+        "weight": (days.astype("datetime64[M]"), weight),
+        "calories": (calorie_days.astype("datetime64[M]"), calories),
+    })
+
+    if len(days):
+        x = (days - days[0]).astype(np.float64)
+        slope, intercept = fit_trend(x, weight, trend)
+        span = float(x[-1])
+        result["trend"] = {
+            "method": trend,
+            "date": _iso(days[[0, -1]]),
+            "weight": _rounded(np.array([intercept, intercept + slope * span])),
+            "kg_per_week": round(slope * 7, 3),
+        }
+        result["weight_change"] = {
+            "total_kg": round(float(weight[-1] - weight[0]), 2),
+            "days": int(span),
+            "kg_per_week": round(float(weight[-1] - weight[0]) / span * 7, 3) if span else 0.0,
+        }
+    else:
+        result["trend"] = None
+        result["weight_change"] = None
+    return result
+
+class AnalyticsCache(TTLCache):
+    """
+    Encoded analytics responses per user, one entry per user holding the
+    last max_variants (window, trend, points) variants requested, so a write
+    drops them all at once and memory stays within maxsize * max_variants.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None, max_variants: int = ANALYTICS_VARIANTS_PER_USER):
+        super().__init__(maxsize, ttl)
+        self.max_variants = max_variants
+        # A response computed from reads that started before one of the
+        # user's writes must not be cached after it. Every invalidation
+        # stamps the user with the next write number; the oldest stamps are
+        # forgotten past maxsize, and forgotten users read as the newest
+        # stamp forgotten so far, which is never older than their own.
+        self._writes = 0
+        self._generations: "OrderedDict[int, int]" = OrderedDict()
+        self._forgotten_generation = 0
+
+    def generation(self, user_id: int) -> int:
+        return self._generations.get(user_id, self._forgotten_generation)
+
+    def get_response(self, user_id: int, variant: Tuple) -> Optional[bytes]:
+        variants = self.get(user_id)
+        if variants is None or variant not in variants:
+            return None
+        variants.move_to_end(variant)
+        return variants[variant]
+
+    def set_response(self, user_id: int, variant: Tuple, body: bytes, generation: int) -> None:
+        if generation != self.generation(user_id):
+            return
+        variants = self.get(user_id)
+        if variants is None:
+            variants = OrderedDict()
+            self.set(user_id, variants)
+        variants[variant] = body
+        variants.move_to_end(variant)
+        while len(variants) > self.max_variants:
+            variants.popitem(last=False)
+
+    def invalidate_user(self, user_id: int) -> None:
+        self._writes += 1
+        self._generations[user_id] = self._writes
+        self._generations.move_to_end(user_id)
+        while len(self._generations) > self.maxsize:
+            _, forgotten = self._generations.popitem(last=False)
+            self._forgotten_generation = forgotten
+        self.pop(user_id)
+
+analytics_cache = AnalyticsCache(maxsize=ANALYTICS_CACHE_SIZE, ttl=ANALYTICS_CACHE_MAX_AGE)
@@ -0,0 +1,6 @@
+import requests
+
+# One HTTP session for every GUI screen: connections are reused, and cookies
+# the API sets, such as the one keeping reads on the primary database right
+# after a write, go back with the next request
+http = requests.Session()
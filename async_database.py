@@ -0,0 +1,386 @@
+from sqlalchemy import select, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from datetime import date
+from fastapi import HTTPException, Request, Response, status
+from typing import Optional, List, Tuple, Dict, Any
+import logging
+import math
+import os
+import time
+
+from models import User, Food, FoodLog, Progress, DailyNutrition, get_async_engine, get_read_engine
+from schemas import UserCreate, FoodLogCreate, ProgressCreate, UserUpdate
+from rollups import (
+    bump_daily_nutrition_stmt, daily_totals_query, insert_progress_stmt, refresh_progress_intake_stmt
+)
+from db_utils import insert_food_log_from_food, insert_rows_returning_ids, encode_foodlog_cursor, decode_foodlog_cursor
+from partitions import archive_cutoff_select, cutoff_cache, user_foodlogs_select
+from db_operations import SECRET_KEY, ALGORITHM, create_access_token, seed_foods
+from password_hashing import password_hasher
+from serialization import rows_to_dicts
+from schema import migrate_connection
+
+__all__ = [
+    # Token settings and helpers, shared with db_operations
+    "SECRET_KEY", "ALGORITHM", "create_access_token",
+    "AsyncSessionLocal", "get_db", "get_read_db", "read_session", "note_write", "wrote_recently",
+    "create_tables", "create_user", "authenticate_user", "get_user", "get_user_by_email", "update_user",
+    "get_foods", "seed_default_foods", "create_food_log", "create_food_logs", "get_archive_cutoff",
+    "get_user_foodlogs", "get_user_foodlogs_page", "get_daily_totals", "create_progress",
+    "get_progress_series", "get_user_progress",
+]
+
+logger = logging.getLogger(__name__)
+
+class LazyAsyncSessionmaker(async_sessionmaker):
+    # Binds sessions to the shared async engine from models when they are
+    # opened, so importing this module does not create the engine
+    def __call__(self, **local_kw):
+        local_kw.setdefault("bind", get_async_engine())
+        return super().__call__(**local_kw)
+
+# ORM objects stay readable after commit, since lazy refreshes cannot run outside the event loop
+AsyncSessionLocal = LazyAsyncSessionmaker(expire_on_commit=False, autoflush=False)
+
+async def get_db():
+    """
+    Dependency function that yields async database sessions.
+    Usage in FastAPI:
+    @app.get("/")
+    async def read_items(db: AsyncSession = Depends(get_db)):
+        ...
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Replicas lag the primary, so for this many seconds after a write the
+# client's reads stay on the primary and it sees what it just saved. The
+# write time travels in a cookie, so this holds whichever worker serves
+# the next request.
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+LAST_WRITE_COOKIE = "last_write"
+
+def note_write(response: Response) -> None:
+    """Pin the client's reads to the primary for READ_YOUR_WRITES_SECONDS."""
+    if READ_YOUR_WRITES_SECONDS > 0:
+        response.set_cookie(
+            LAST_WRITE_COOKIE, f"{time.time():.3f}",
+            max_age=math.ceil(READ_YOUR_WRITES_SECONDS), httponly=True, samesite="lax"
+        )
+
+def wrote_recently(request: Request) -> bool:
+    # Only ever sends a client to the primary, so the value needs no signature
+    try:
+        written_at = float(request.cookies.get(LAST_WRITE_COOKIE, ""))
+    except ValueError:
+        return False
+    return 0 <= time.time() - written_at < READ_YOUR_WRITES_SECONDS
+
+def read_session(primary: bool = False) -> AsyncSession:
+    # A replica, unless the caller needs the primary or none are configured
+    if primary:
+        return AsyncSessionLocal()
+    return AsyncSessionLocal(bind=get_read_engine())
+
+async def get_read_db(request: Request):
+    """
+    Like get_db, for handlers that only read. Sessions go to a read
+    replica when DATABASE_REPLICA_URLS is set, except for a client that
+    wrote within the last READ_YOUR_WRITES_SECONDS.
+    """
+    async with read_session(wrote_recently(request)) as db:
+        yield db
+
+async def create_tables():
+    async with get_async_engine().begin() as conn:
+        await conn.run_sync(migrate_connection)
+
+def _dialect_name(db: AsyncSession) -> str:
+    return db.get_bind().dialect.name
+
+# User operations
+async def create_user(db: AsyncSession, user: UserCreate) -> User:
+    password_hash = await password_hasher.hash(user.password)
+    try:
+        db_user = User(
+            name=user.name,
+            email=user.email,
+            password_hash=password_hash,
+            height=user.height,
+            weight=user.weight,
+            goal=user.goal
+        )
+        db.add(db_user)
+        await db.commit()
+        await db.refresh(db_user)
+        return db_user
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
+
+async def authenticate_user(db: AsyncSession, email: str, password: str) -> Optional[User]:
+    user = await get_user_by_email(db, email)
+    if not user or not await password_hasher.verify(password, user.password_hash):
+        return None
+    return user
+
+async def get_user(db: AsyncSession, user_id: int) -> Optional[User]:
+    result = await db.execute(select(User).where(User.user_id == user_id))
+    return result.scalars().first()
+
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
+
+async def update_user(db: AsyncSession, user_id: int, user_update: UserUpdate) -> Optional[Dict[str, Any]]:
+    """
+    Apply a profile update with a single UPDATE. The unique index on email
+    rejects an address taken by another user, so no lookups run first.
+    Returns the updated fields, or None when the user does not exist.
+    """
+    values = {
+        "name": user_update.name,
+        "email": user_update.email,
+        "height": user_update.height,
+        "weight": user_update.weight,
+        "goal": user_update.goal
+    }
+
+    # Update password if provided
+    if user_update.password:
+        values["password_hash"] = await password_hasher.hash(user_update.password)
+
+    try:
+        result = await db.execute(
+            update(User)
+            .where(User.user_id == user_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered by another user"
+        )
+
+    if result.rowcount == 0:
+        return None
+    values.pop("password_hash", None)
+    return {"user_id": user_id, **values}
+
+# Food operations
+async def get_foods(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[Food]:
+    result = await db.execute(select(Food).offset(skip).limit(limit))
+    return list(result.scalars())
+
+async def seed_default_foods(db: AsyncSession) -> None:
+    await db.run_sync(seed_foods)
+
+# FoodLog operations
+def _food_log_row(food: Food, food_log: FoodLogCreate) -> Dict[str, Any]:
+    # Calculate nutritional values based on quantity
+    return {
+        "user_id": food_log.user_id,
+        "food_id": food_log.food_id,
+        "date": food_log.date,
+        "quantity": food_log.quantity,
+        "calories": int(food.calories * food_log.quantity),
+        "protein": food.protein * food_log.quantity,
+        "fat": food.fat * food_log.quantity,
+        "carbohydrates": food.carbohydrates * food_log.quantity
+    }
+
+async def create_food_log(db: AsyncSession, food_log: FoodLogCreate) -> Dict[str, Any]:
+    """
+    Insert one food log and bump its daily rollup. With RETURNING this is
+    one INSERT ... SELECT plus the rollup upsert; without it the food is
+    read first. The user_id foreign key stands in for a user lookup.
+    """
+    try:
+        logger.debug("Creating food log with data: user_id=%s, food_id=%s, date=%s, quantity=%s", food_log.user_id, food_log.food_id, food_log.date, food_log.quantity)
+
+        row = None
+        if db.get_bind().dialect.insert_returning:
+            result = await db.execute(
+                insert_food_log_from_food(_dialect_name(db), food_log).returning(*FoodLog.__table__.c)
+            )
+            inserted = result.mappings().first()
+            if inserted is not None:
+                row = dict(inserted)
+        else:
+            food = (await db.execute(
+                select(Food.calories, Food.protein, Food.fat, Food.carbohydrates).where(Food.food_id == food_log.food_id)
+            )).first()
+            if food is not None:
+                row = _food_log_row(food, food_log)
+                result = await db.execute(insert(FoodLog).values(row))
+                row["foodlog_id"] = result.inserted_primary_key[0]
+
+        if row is None:
+            logger.error("Food with ID %s not found", food_log.food_id)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Food not found"
+            )
+
+        # Keep the daily rollup, and the intake derived from it, in the same transaction
+        await db.execute(bump_daily_nutrition_stmt(_dialect_name(db), [row]))
+        await db.execute(refresh_progress_intake_stmt([row]))
+        await db.commit()
+
+        logger.info("Food log created successfully with ID: %s", row['foodlog_id'])
+        return row
+
+    except HTTPException as e:
+        # Re-raise HTTP exceptions
+        raise e
+    except IntegrityError:
+        await db.rollback()
+        logger.error("User with ID %s not found", food_log.user_id)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"User with ID {food_log.user_id} not found"
+        )
+    except Exception as e:
+        await db.rollback()
+        logger.error("Error creating food log: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error creating food log: {str(e)}"
+        )
+
+async def create_food_logs(db: AsyncSession, food_logs: List[FoodLogCreate]) -> List[dict]:
+    if not food_logs:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No food logs to create"
+        )
+
+    # Validate every referenced food with a single query
+    food_ids = {food_log.food_id for food_log in food_logs}
+    result = await db.execute(select(Food).where(Food.food_id.in_(food_ids)))
+    foods = {food.food_id: food for food in result.scalars()}
+    missing = sorted(food_ids - foods.keys())
+    if missing:
+        logger.error("Foods not found: %s", missing)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Food not found: {', '.join(str(food_id) for food_id in missing)}"
+        )
+
+    rows = [_food_log_row(foods[food_log.food_id], food_log) for food_log in food_logs]
+
+    try:
+        foodlog_ids = await db.run_sync(insert_rows_returning_ids, FoodLog.__table__, rows)
+        await db.execute(bump_daily_nutrition_stmt(_dialect_name(db), rows))
+        await db.execute(refresh_progress_intake_stmt(rows))
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.error("Error creating food logs: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error creating food logs: {str(e)}"
+        )
+
+    logger.info("Created %s food logs in one batch", len(rows))
+    return [{"foodlog_id": foodlog_id, **row} for foodlog_id, row in zip(foodlog_ids, rows)]
+
+async def get_archive_cutoff(db: AsyncSession) -> Optional[date]:
+    # Cached in a tuple so that "nothing archived yet" is cached too
+    cached = cutoff_cache.get("food_logs")
+    if cached is None:
+        cached = ((await db.execute(archive_cutoff_select())).scalar(),)
+        cutoff_cache.set("food_logs", cached)
+    return cached[0]
+
+async def get_user_foodlogs(db: AsyncSession, user_id: int, start: Optional[date] = None, end: Optional[date] = None) -> List[dict]:
+    archived_before = await get_archive_cutoff(db)
+    result = await db.execute(user_foodlogs_select(user_id, start, end, archived_before=archived_before))
+    return rows_to_dicts(result.keys(), result)
+
+async def get_user_foodlogs_page(
+    db: AsyncSession,
+    user_id: int,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100
+) -> Tuple[List[dict], Optional[str]]:
+    after = decode_foodlog_cursor(cursor) if cursor else None
+    archived_before = await get_archive_cutoff(db)
+    query = user_foodlogs_select(user_id, start, end, after=after, archived_before=archived_before)
+
+    # Fetch one extra row to find out whether another page exists
+    result = await db.execute(query.limit(limit + 1))
+    foodlogs = result.all()
+    next_cursor = None
+    if len(foodlogs) > limit:
+        foodlogs = foodlogs[:limit]
+        last_log = foodlogs[-1]
+        next_cursor = encode_foodlog_cursor(last_log.date, last_log.foodlog_id)
+
+    return rows_to_dicts(result.keys(), foodlogs), next_cursor
+
+async def get_daily_totals(db: AsyncSession, user_id: int, start: Optional[date] = None, end: Optional[date] = None) -> List[Dict[str, Any]]:
+    result = await db.execute(daily_totals_query(user_id, start, end))
+    return [dict(row) for row in result.mappings()]
+
+# Progress operations
+async def create_progress(db: AsyncSession, progress: ProgressCreate) -> Dict[str, Any]:
+    # Intake is whatever the food log says for that day, never the client's
+    # number, read in the INSERT itself so a food log committed alongside
+    # cannot slip in between. The id and intake come back with the INSERT
+    # where RETURNING exists; MySQL reads the new row back.
+    values = progress.dict()
+    if db.get_bind().dialect.insert_returning:
+        result = await db.execute(
+            insert_progress_stmt(progress).returning(Progress.progress_id, Progress.calorie_intake)
+        )
+        progress_id, values["calorie_intake"] = result.one()
+    else:
+        progress_id = (await db.execute(insert_progress_stmt(progress))).lastrowid
+        values["calorie_intake"] = (await db.execute(
+            select(Progress.calorie_intake).where(Progress.progress_id == progress_id)
+        )).scalar_one()
+    await db.commit()
+    return {"progress_id": progress_id, **values}
+
+async def get_progress_series(db: AsyncSession, user_id: int) -> Tuple[Dict[str, list], Dict[str, list]]:
+    # Column lists in date order: progress entries, then daily calorie totals
+    progress = (await db.execute(
+        select(Progress.date, Progress.weight, Progress.bmi, Progress.calorie_intake)
+        .where(Progress.user_id == user_id)
+        .order_by(Progress.date, Progress.progress_id)
+    )).all()
+    daily = (await db.execute(
+        select(DailyNutrition.date, DailyNutrition.calories)
+        .where(DailyNutrition.user_id == user_id)
+        .order_by(DailyNutrition.date)
+    )).all()
+    progress_columns = list(zip(*progress)) or [(), (), (), ()]
+    daily_columns = list(zip(*daily)) or [(), ()]
+    return (
+        dict(zip(("date", "weight", "bmi", "calorie_intake"), progress_columns)),
+        dict(zip(("date", "calories"), daily_columns))
+    )
+
+async def get_user_progress(db: AsyncSession, user_id: int) -> List[dict]:
+    result = await db.execute(
+        select(
+            Progress.progress_id,
+            Progress.user_id,
+            Progress.weight,
+            Progress.bmi,
+            Progress.calorie_intake,
+            Progress.date
+        ).where(Progress.user_id == user_id)
+        .order_by(Progress.date, Progress.progress_id)
+    )
+    return rows_to_dicts(result.keys(), result)
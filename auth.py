@@ -1,6 +1,6 @@
 import sys
 import os
-import requests
+from api_client import http
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QStackedWidget, QVBoxLayout, QFormLayout,
     QLineEdit, QPushButton, QLabel, QComboBox, QMessageBox, QHBoxLayout, QFrame,
@@ -137,7 +137,7 @@ class LoginWidget(QWidget):
             "password": self.password.text()
         }
         try:
-            r = requests.post(f"{API_URL}/login", data=data)
+            r = http.post(f"{API_URL}/login", data=data)
             if r.status_code == 200:
                 response_data = r.json()
                 token = response_data.get("access_token")
@@ -167,7 +167,7 @@ class LoginWidget(QWidget):
             if token:
                 headers["Authorization"] = f"Bearer {token}"
                 
-            r = requests.get(f"{API_URL}/users", params={"email": self.email.text()}, headers=headers)
+            r = http.get(f"{API_URL}/users", params={"email": self.email.text()}, headers=headers)
             if r.status_code == 200:
                 return r.json()
         except Exception as e:
@@ -368,7 +368,7 @@ class RegisterWidget(QWidget):
             "goal": self.goal.currentText()
         }
         try:
-            r = requests.post(f"{API_URL}/register", json=data)
+            r = http.post(f"{API_URL}/register", json=data)
             if r.status_code == 201:
                 QMessageBox.information(self, "Success", "Registration successful! Please login.")
                 # Clear the form and switch to login
@@ -0,0 +1,71 @@
+"""
+Build the food search index over a synthetic catalog and time lookups.
+
+Usage:
+    python benchmarks/food_search_bench.py --foods 500000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from food_search import FoodSearchIndex
+
+WORDS = [
+    "chicken", "breast", "grilled", "roasted", "beef", "ground", "lean", "salmon", "tuna",
+    "apple", "banana", "orange", "rice", "brown", "white", "bread", "whole", "wheat",
+    "milk", "skim", "yogurt", "greek", "plain", "cheese", "cheddar", "mozzarella", "egg",
+    "boiled", "fried", "oats", "rolled", "quinoa", "lentils", "beans", "black", "green",
+    "spinach", "broccoli", "carrot", "potato", "sweet", "avocado", "almonds", "peanut",
+    "butter", "olive", "oil", "pasta", "tomato", "sauce", "soup", "frozen", "canned", "raw"
+]
+
+QUERIES = ["chicken", "chick", "gre", "brocoli", "chiken brest", "wheat bread", "mozarella", "oats rolled", "xyz", "e"]
+
+def synthetic_foods(count, seed=42, brands=5000):
+    # Names combine common food words with a long tail of brand-like words,
+    # roughly the shape of a branded nutrition database
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    brand_words = ["".join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(brands)]
+    for food_id in range(1, count + 1):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(2, 4))]
+        if rng.random() < 0.7:
+            words.insert(0, rng.choice(brand_words))
+        yield {"food_id": food_id, "name": " ".join(words).title(), "calories": 100,
+               "protein": 1.0, "fat": 1.0, "carbohydrates": 1.0}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--foods", type=int, default=500000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    index = FoodSearchIndex()
+    started = time.perf_counter()
+    index.build(synthetic_foods(args.foods))
+    print(f"Built index over {len(index)} foods in {time.perf_counter() - started:.2f}s")
+
+    started = time.perf_counter()
+    index.add({"food_id": args.foods + 1, "name": "Dragon Fruit", "calories": 60,
+               "protein": 1.2, "fat": 0.0, "carbohydrates": 13.0})
+    index.remove(args.foods + 1)
+    print(f"Incremental add + remove: {(time.perf_counter() - started) * 1000:.2f}ms")
+
+    for query in QUERIES:
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            results = index.search(query, args.limit)
+            timings.append((time.perf_counter() - started) * 1000)
+        top = results[0]["name"] if results else "-"
+        print(f"{query!r:16} median {statistics.median(timings):.3f}ms  "
+              f"max {max(timings):.3f}ms  results {len(results):3}  top {top!r}")
+
+if __name__ == "__main__":
+    main()
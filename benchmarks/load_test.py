@@ -0,0 +1,281 @@
+"""
+Load test the API with a weighted mix of user actions and report
+throughput and latency percentiles per endpoint.
+
+By default the app from main.py runs in process through an ASGI transport
+on a fresh SQLite database, so no server or MySQL is needed. Pass --url to
+drive a running uvicorn instead.
+
+Usage:
+    python benchmarks/load_test.py --duration 30 --concurrency 32
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --users 50
+    python benchmarks/load_test.py --output after.json --compare before.json
+    python benchmarks/load_test.py --mix "read_logs=10,post_foodlog=1"
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx
+
+DEFAULT_MIX = "login=1,foods=4,search_foods=3,post_foodlog=3,read_logs=6,daily_totals=2,read_progress=2,post_progress=1"
+
+class Stats:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, name, seconds, ok):
+        self.latencies.setdefault(name, []).append(seconds)
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def summarize(stats, elapsed):
+    endpoints = {}
+    for name, values in sorted(stats.latencies.items()):
+        values = sorted(values)
+        endpoints[name] = {
+            "requests": len(values),
+            "errors": stats.errors.get(name, 0),
+            "throughput_rps": len(values) / elapsed,
+            "mean_ms": sum(values) / len(values) * 1000,
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p95_ms": percentile(values, 0.95) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+            "max_ms": values[-1] * 1000,
+        }
+    total = sum(endpoint["requests"] for endpoint in endpoints.values())
+    return {
+        "total_requests": total,
+        "total_errors": sum(endpoint["errors"] for endpoint in endpoints.values()),
+        "throughput_rps": total / elapsed,
+        "endpoints": endpoints,
+    }
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, weight = part.split("=")
+        if name not in ACTIONS:
+            raise SystemExit(f"Unknown action {name!r}; choose from {', '.join(ACTIONS)}")
+        mix[name] = float(weight)
+    return mix
+
+class VirtualUser:
+    """One registered account with its token and a random walk of actions."""
+
+    def __init__(self, client, email, password, rng):
+        self.client = client
+        self.email = email
+        self.password = password
+        self.rng = rng
+        self.user_id = None
+        self.headers = {}
+
+    async def register_and_login(self):
+        await self.client.post("/register", json={
+            "name": "Load Test", "email": self.email, "password": self.password,
+            "height": 175, "weight": 75, "goal": "maintain"
+        })
+        response = await self.login()
+        response.raise_for_status()
+        self.user_id = (await self.client.get("/users", params={"email": self.email})).json()["user_id"]
+
+    async def login(self):
+        response = await self.client.post("/login", data={"username": self.email, "password": self.password})
+        if response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        return response
+
+    def random_date(self):
+        return (datetime.date(2024, 1, 1) + datetime.timedelta(days=self.rng.randrange(90))).isoformat()
+
+async def action_login(user):
+    return await user.login()
+
+async def action_foods(user):
+    return await user.client.get("/foods", params={"limit": 100})
+
+async def action_search_foods(user):
+    query = user.rng.choice(["chick", "apple", "ric", "brocoli", "yog", "oat", "beef"])
+    return await user.client.get("/foods/search", params={"q": query})
+
+async def action_post_foodlog(user):
+    return await user.client.post("/foodlogs", headers=user.headers, json={
+        "user_id": user.user_id, "food_id": user.rng.randint(1, 30),
+        "quantity": user.rng.choice([0.5, 1, 1.5, 2]), "date": user.random_date()
+    })
+
+async def action_read_logs(user):
+    return await user.client.get(f"/users/{user.user_id}/foodlogs", headers=user.headers, params={"limit": 100})
+
+async def action_daily_totals(user):
+    return await user.client.get(f"/users/{user.user_id}/daily-totals", headers=user.headers)
+
+async def action_read_progress(user):
+    return await user.client.get(f"/progress/{user.user_id}", headers=user.headers)
+
+async def action_post_progress(user):
+    return await user.client.post("/progress", headers=user.headers, json={
+        "user_id": user.user_id, "weight": round(user.rng.uniform(60, 90), 1), "bmi": 24.0,
+        "calorie_intake": user.rng.randint(1500, 3000), "date": user.random_date()
+    })
+
+ACTIONS = {
+    "login": action_login,
+    "foods": action_foods,
+    "search_foods": action_search_foods,
+    "post_foodlog": action_post_foodlog,
+    "read_logs": action_read_logs,
+    "daily_totals": action_daily_totals,
+    "read_progress": action_read_progress,
+    "post_progress": action_post_progress,
+}
+
+async def worker(users, mix, stats, deadline, remaining, rng):
+    names, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline and remaining[0] > 0:
+        remaining[0] -= 1
+        name = rng.choices(names, weights)[0]
+        user = rng.choice(users)
+        started = time.perf_counter()
+        try:
+            response = await ACTIONS[name](user)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        stats.record(name, time.perf_counter() - started, ok)
+
+async def run(args, client):
+    rng = random.Random(args.seed)
+    await client.post("/seed-foods")
+
+    # Accounts are created up front so the measured phase is steady state
+    run_id = f"{int(time.time())}{rng.randrange(10000)}"
+    users = [VirtualUser(client, f"load{run_id}_{i}@example.com", "load-test", random.Random(args.seed + i))
+             for i in range(args.users)]
+    for start in range(0, len(users), 8):
+        await asyncio.gather(*(user.register_and_login() for user in users[start:start + 8]))
+
+    # Warm caches and connections before measuring
+    warmup = Stats()
+    remaining = [args.concurrency * 5]
+    await asyncio.gather(*(worker(users, args.mix, warmup, float("inf"), remaining, random.Random(i))
+                           for i in range(args.concurrency)))
+
+    stats = Stats()
+    remaining = [args.requests or float("inf")]
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*(worker(users, args.mix, stats, deadline, remaining, random.Random(args.seed * 1000 + i))
+                           for i in range(args.concurrency)))
+    return summarize(stats, time.perf_counter() - started)
+
+async def run_in_process(args):
+    # Fresh SQLite file unless a database was configured explicitly
+    tmp = None
+    if not os.getenv("DATABASE_URL") and not os.getenv("ASYNC_DATABASE_URL"):
+        tmp = tempfile.TemporaryDirectory()
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp.name, 'load_test.db')}"
+    # Every simulated user shares one client address
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    import main
+
+    # ASGITransport does not send lifespan events, so run the hooks here
+    await main.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as client:
+            return await run(args, client)
+    finally:
+        await main.app.router.shutdown()
+        if tmp is not None:
+            tmp.cleanup()
+
+async def run_remote(args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=60, limits=limits) as client:
+        return await run(args, client)
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_report(result, baseline=None):
+    print(f"{'endpoint':15} {'requests':>8} {'errors':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, endpoint in result["endpoints"].items():
+        line = (f"{name:15} {endpoint['requests']:8} {endpoint['errors']:6} {endpoint['throughput_rps']:8.1f} "
+                f"{endpoint['p50_ms']:8.2f} {endpoint['p95_ms']:8.2f} {endpoint['p99_ms']:8.2f} {endpoint['max_ms']:8.2f}")
+        before = (baseline or {}).get("endpoints", {}).get(name)
+        if before:
+            line += f"   p50 {_change(before['p50_ms'], endpoint['p50_ms'])}  p95 {_change(before['p95_ms'], endpoint['p95_ms'])}"
+        print(line)
+    print(f"total: {result['total_requests']} requests, {result['total_errors']} errors, "
+          f"{result['throughput_rps']:.1f} req/s")
+    if baseline:
+        print(f"baseline ({baseline.get('commit')}): {baseline['throughput_rps']:.1f} req/s "
+              f"({_change(baseline['throughput_rps'], result['throughput_rps'])})")
+
+def _change(before, after):
+    return f"{(after - before) / before * 100:+.0f}%" if before else "n/a"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="Target a running server instead of the in-process app")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent virtual clients")
+    parser.add_argument("--users", type=int, default=20, help="Accounts registered before the run")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds to run for")
+    parser.add_argument("--requests", type=int, default=0, help="Stop after this many requests instead")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weighted actions, default {DEFAULT_MIX}")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="Write results as JSON to this file")
+    parser.add_argument("--compare", default=None, help="JSON results of an earlier run to compare against")
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's per-request INFO logs")
+    args = parser.parse_args()
+    args.mix = parse_mix(args.mix)
+    if not args.verbose:
+        # The app logs a line per request at INFO; that skews the numbers
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    result = asyncio.run(run_remote(args) if args.url else run_in_process(args))
+    result = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "target": args.url or "in-process",
+        "database": None if args.url else os.getenv("DATABASE_URL"),
+        "config": {"concurrency": args.concurrency, "users": args.users, "duration": args.duration,
+                   "requests": args.requests, "mix": args.mix, "seed": args.seed},
+        **result,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Per-row cost of producing a food log list response, old path against the
+column-tuple + orjson path, on a SQLite database with --rows food logs.
+
+Old: ORM entities -> dict with strftime -> response_model validation and
+     jsonable_encoder -> json.dumps (what FastAPI does for List[FoodLogResponse])
+New: column tuples -> dicts -> orjson, optionally validated through a
+     cached TypeAdapter (VALIDATE_RESPONSES=1)
+
+Usage:
+    python benchmarks/serialization_bench.py --rows 100000
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+from typing import List
+import orjson
+
+from models import Base, User, Food, FoodLog
+from schemas import FoodLogDetailResponse
+from serialization import list_adapter, rows_to_dicts
+
+def populate(engine, rows):
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"name": "Bench", "email": "bench@example.com", "password_hash": "x",
+                                     "height": 180, "weight": 80, "goal": "maintain"}])
+        conn.execute(insert(Food), [{"name": f"Food {i}", "name_key": f"food {i}", "calories": 100 + i,
+                                     "protein": 1.5, "fat": 2.5, "carbohydrates": 3.5} for i in range(1, 101)])
+        start = datetime.date(2000, 1, 1)
+        for offset in range(0, rows, 50000):
+            conn.execute(insert(FoodLog), [
+                {"user_id": 1, "food_id": i % 100 + 1, "date": start + datetime.timedelta(days=i // 10),
+                 "quantity": 1.5, "calories": 150, "protein": 2.25, "fat": 3.75, "carbohydrates": 5.25}
+                for i in range(offset, min(rows, offset + 50000))
+            ])
+
+def old_path(db):
+    result = db.execute(
+        select(FoodLog, Food.name.label("food_name"))
+        .join(Food, FoodLog.food_id == Food.food_id)
+        .where(FoodLog.user_id == 1)
+        .order_by(FoodLog.date, FoodLog.foodlog_id)
+    )
+    foodlogs = [{
+        "foodlog_id": log.foodlog_id, "user_id": log.user_id, "food_id": log.food_id, "food_name": food_name,
+        "date": log.date.strftime('%Y-%m-%d'), "quantity": log.quantity, "calories": log.calories,
+        "protein": log.protein, "fat": log.fat, "carbohydrates": log.carbohydrates
+    } for log, food_name in result]
+    field = create_response_field(name="Response_read_user_foodlogs", type_=List[FoodLogDetailResponse])
+    content = asyncio.run(serialize_response(field=field, response_content=foodlogs, is_coroutine=True))
+    return JSONResponse(content).body
+
+def new_rows(db):
+    result = db.execute(
+        select(FoodLog.foodlog_id, FoodLog.user_id, FoodLog.food_id, Food.name.label("food_name"), FoodLog.date,
+               FoodLog.quantity, FoodLog.calories, FoodLog.protein, FoodLog.fat, FoodLog.carbohydrates)
+        .join(Food, FoodLog.food_id == Food.food_id)
+        .where(FoodLog.user_id == 1)
+        .order_by(FoodLog.date, FoodLog.foodlog_id)
+    )
+    return rows_to_dicts(result.keys(), result)
+
+def new_path(db):
+    return orjson.dumps(new_rows(db))
+
+def new_path_validated(db):
+    adapter = list_adapter(FoodLogDetailResponse)
+    return adapter.dump_json(adapter.validate_python(new_rows(db)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        populate(engine, args.rows)
+        baseline = None
+        for name, path in (("old", old_path), ("new", new_path), ("new+validate", new_path_validated)):
+            timings = []
+            for _ in range(args.repeat):
+                with Session(engine) as db:
+                    started = time.perf_counter()
+                    body = path(db)
+                    timings.append(time.perf_counter() - started)
+            best = min(timings)
+            baseline = baseline or best
+            print(f"{name:13} {best:.3f}s  {best / args.rows * 1e6:6.2f}us/row  "
+                  f"{baseline / best:4.1f}x  {len(body) / 1e6:.1f} MB")
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Count the database round trips (statements plus commits) each write
+endpoint makes and fail when one goes over its budget. Runs the app
+in-process against an in-memory SQLite database unless
+ASYNC_DATABASE_URL points elsewhere.
+
+Usage:
+    python benchmarks/statement_counts.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("ASYNC_DATABASE_URL", "sqlite+aiosqlite://")
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "1")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import main
+from models import get_async_engine
+
+# Round trips per request with the token already cached. Databases without
+# INSERT ... RETURNING (MySQL) read the food before inserting a food log, and
+# the day's calories before inserting a progress entry. Food log writes also
+# refresh the calorie intake of progress entries on the same days.
+BUDGETS = {
+    "POST /foodlogs": (4, 5),
+    "POST /foodlogs/batch": (5, 5),
+    "PUT /users/{user_id}": (2, 2),
+    "POST /progress": (2, 3),
+}
+
+class RoundTripCounter:
+    def __init__(self, engine):
+        self.statements = []
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+        event.listen(engine, "commit", self._on_commit)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(" ".join(statement.split())[:90])
+
+    def _on_commit(self, conn):
+        self.statements.append("COMMIT")
+
+    def measure(self, request):
+        self.statements = []
+        response = request()
+        return response, list(self.statements)
+
+def measure_endpoints():
+    """
+    Run each write endpoint once and return
+    {endpoint: (response, statements, budget)} for this database.
+    """
+    engine = get_async_engine().sync_engine
+    returning = engine.dialect.insert_returning
+    counter = RoundTripCounter(engine)
+    measured = {}
+
+    with TestClient(main.app) as client:
+        client.post("/seed-foods")
+        user = client.post("/register", json={
+            "name": "Counter", "email": "counter@example.com", "password": "secret",
+            "height": 180, "weight": 80, "goal": "maintain"
+        }).json()
+        token = client.post("/login", data={"username": "counter@example.com", "password": "secret"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        user_id = user["user_id"]
+
+        food_log = {"user_id": user_id, "food_id": 1, "quantity": 1.5, "date": "2024-01-01"}
+        checks = {
+            "POST /foodlogs": lambda: client.post("/foodlogs", json=food_log, headers=headers),
+            "POST /foodlogs/batch": lambda: client.post("/foodlogs/batch", json=[food_log] * 3, headers=headers),
+            "PUT /users/{user_id}": lambda: client.put(f"/users/{user_id}", json={
+                "name": "Counted", "email": "counter@example.com", "height": 181, "weight": 79, "goal": "cut"
+            }, headers=headers),
+            "POST /progress": lambda: client.post("/progress", json={
+                "user_id": user_id, "weight": 79, "bmi": 24.1, "calorie_intake": 2100, "date": "2024-01-01"
+            }, headers=headers),
+        }
+
+        for endpoint, request in checks.items():
+            # Warm the token cache, which the profile update drops, so only
+            # the endpoint's own queries are counted
+            client.get(f"/users/{user_id}", headers=headers)
+            response, statements = counter.measure(request)
+            measured[endpoint] = (response, statements, BUDGETS[endpoint][0 if returning else 1])
+    return measured
+
+def run():
+    failures = 0
+    for endpoint, (response, statements, budget) in measure_endpoints().items():
+        ok = response.status_code < 400 and len(statements) <= budget
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {endpoint:24} {len(statements)} round trips (budget {budget}, HTTP {response.status_code})")
+        for statement in statements:
+            print(f"       {statement}")
+
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,96 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Set
+import time
+
+class TTLCache:
+    """
+    In-process LRU cache where every entry also carries an absolute expiry
+    time. The least recently used entry is evicted once maxsize is reached.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[float] = None) -> None:
+        # Cap the entry's lifetime at the cache-wide ttl
+        if self.ttl is not None:
+            ttl_deadline = time.time() + self.ttl
+            expires_at = ttl_deadline if expires_at is None else min(expires_at, ttl_deadline)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        self._entries[key] = (value, expires_at)
+        while len(self._entries) > self.maxsize:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        if key in self._entries:
+            self._remove(key)
+
+    def _remove(self, key: Hashable) -> None:
+        del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+class TokenUserCache(TTLCache):
+    """
+    Maps a verified access token to a snapshot of its user. Keeps an index
+    from user_id to tokens so a profile change drops every cached token.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        super().__init__(maxsize, ttl)
+        self._tokens_by_user: Dict[int, Set[Hashable]] = {}
+
+    def set_user(self, token: str, user: Any, expires_at: Optional[float] = None) -> None:
+        self.set(token, user, expires_at)
+        self._tokens_by_user.setdefault(user.user_id, set()).add(token)
+
+    def _remove(self, key: Hashable) -> None:
+        value, _ = self._entries.pop(key)
+        tokens = self._tokens_by_user.get(value.user_id)
+        if tokens is not None:
+            tokens.discard(key)
+            if not tokens:
+                del self._tokens_by_user[value.user_id]
+
+    def invalidate_user(self, user_id: int) -> None:
+        for token in list(self._tokens_by_user.get(user_id, ())):
+            self.pop(token)
+
+    def clear(self) -> None:
+        super().clear()
+        self._tokens_by_user.clear()
@@ -0,0 +1,250 @@
+from sqlalchemy import func, insert, select
+from sqlalchemy.engine import Connection
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+import itertools
+import logging
+import multiprocessing
+import random
+import time
+
+from models import SessionLocal, User, Food, FoodLog, Progress, DailyNutrition, get_engine
+from food_import import insert_missing_foods, parse_food
+from password_hashing import get_password_hash
+
+logger = logging.getLogger(__name__)
+
+# Every generated account logs in with this password
+SYNTHETIC_PASSWORD = "synthetic-password"
+# Must pass email-validator, which rejects reserved names such as .test
+SYNTHETIC_EMAIL_DOMAIN = "example.com"
+
+# Users handled per task and transaction
+CHUNK_USERS = 500
+DEFAULT_BATCH_SIZE = 10000
+
+# Activity is Pareto distributed: most users log now and then, a few log
+# every meal every day. Food choice follows Zipf's law over a fixed
+# popularity order, so a few hundred foods make up most log entries.
+ACTIVITY_ALPHA = 1.5
+MAX_ACTIVITY = 10.0
+FOOD_ZIPF_EXPONENT = 0.9
+
+GOALS = ("lose", "maintain", "gain")
+QUANTITIES = (0.5, 1, 1, 1, 1.5, 2)
+
+FOOD_BRANDS = ("", "", "", "Organic", "Homestyle", "Fresh", "Classic", "Lite", "Farm", "Golden", "Wild", "Roasted")
+FOOD_BASES = (
+    "Chicken Breast", "Rice", "Oats", "Apple", "Banana", "Salmon", "Yogurt", "Bread", "Pasta", "Beef",
+    "Tofu", "Lentils", "Broccoli", "Spinach", "Cheese", "Milk", "Almonds", "Eggs", "Potato", "Beans",
+    "Granola", "Soup", "Salad", "Pizza", "Burrito", "Smoothie", "Cereal", "Cookies", "Chips", "Sandwich",
+)
+FOOD_STYLES = ("", "", "Grilled", "Baked", "Steamed", "Fried", "Spicy", "Sweet", "Smoked", "Instant")
+
+def synthetic_foods(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    # Names are unique by construction, so every row survives the name_key dedupe
+    rng = random.Random(seed)
+    combos = list(itertools.product(FOOD_BRANDS, FOOD_STYLES, FOOD_BASES))
+    foods = []
+    for i in range(count):
+        brand, style, base = combos[i % len(combos)]
+        name = " ".join(part for part in (brand, style, base) if part)
+        if i >= len(combos):
+            name = f"{name} {i // len(combos) + 1}"
+        foods.append(parse_food({
+            "name": name,
+            "calories": rng.randint(15, 650),
+            "protein": round(rng.uniform(0, 35), 1),
+            "fat": round(rng.uniform(0, 30), 1),
+            "carbohydrates": round(rng.uniform(0, 80), 1)
+        }))
+    return foods
+
+class GenerationStats:
+    def __init__(self):
+        self.users = 0
+        self.food_logs = 0
+        self.progress = 0
+        self.chunks = 0
+        self.started_at = time.perf_counter()
+
+    def add(self, chunk: Dict[str, int]) -> None:
+        self.users += chunk["users"]
+        self.food_logs += chunk["food_logs"]
+        self.progress += chunk["progress"]
+        self.chunks += 1
+
+    @property
+    def rows_per_second(self) -> float:
+        elapsed = time.perf_counter() - self.started_at
+        return (self.users + self.food_logs + self.progress) / elapsed if elapsed else 0.0
+
+    def __str__(self):
+        return (f"{self.users} users, {self.food_logs} food logs, {self.progress} progress rows "
+                f"in {time.perf_counter() - self.started_at:.1f}s ({self.rows_per_second:.0f} rows/s)")
+
+# Per process catalog: (food rows in popularity order, cumulative Zipf weights)
+_catalog = None
+
+def _load_catalog(conn: Connection, seed: int):
+    global _catalog
+    if _catalog is None:
+        foods = conn.execute(
+            select(Food.food_id, Food.calories, Food.protein, Food.fat, Food.carbohydrates).order_by(Food.food_id)
+        ).all()
+        if not foods:
+            raise RuntimeError("The foods table is empty; generate or import foods first")
+        # Same seed in every worker, so all processes agree on what is popular
+        random.Random(seed).shuffle(foods)
+        cum_weights = list(itertools.accumulate(1 / rank ** FOOD_ZIPF_EXPONENT for rank in range(1, len(foods) + 1)))
+        _catalog = (foods, cum_weights)
+    return _catalog
+
+def generate_chunk(task: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Insert one chunk of users with their whole history. Runs in worker
+    processes, so it takes and returns plain data. Each batch commits on its
+    own so no worker holds the write lock for long, which SQLite needs.
+    """
+    rng = random.Random(task["seed"] * 1_000_003 + task["first_user_id"])
+    end = task["end_date"]
+    days = task["days"]
+    batch_size = task["batch_size"]
+    counts = {"users": 0, "food_logs": 0, "progress": 0}
+    engine = get_engine()
+
+    with engine.connect() as conn:
+        foods, cum_weights = _load_catalog(conn, task["seed"])
+
+    users = []
+    for user_id in range(task["first_user_id"], task["first_user_id"] + task["users"]):
+        height = round(rng.gauss(172, 9), 1)
+        users.append({
+            "user_id": user_id,
+            "name": f"Synthetic User {user_id}",
+            "email": f"synthetic{user_id}@{SYNTHETIC_EMAIL_DOMAIN}",
+            "password_hash": task["password_hash"],
+            "height": height,
+            "weight": round(max(45.0, rng.gauss(24, 4) * (height / 100) ** 2), 1),
+            "goal": rng.choice(GOALS),
+            "created_at": datetime.combine(end - timedelta(days=days), datetime.min.time())
+        })
+    with engine.begin() as conn:
+        conn.execute(insert(User), users)
+    counts["users"] = len(users)
+
+    food_logs, daily_rows, progress_rows = [], [], []
+
+    def flush(final: bool = False):
+        # Keep memory flat: send full batches as we go
+        batches = [(table, rows) for table, rows in ((FoodLog, food_logs), (DailyNutrition, daily_rows), (Progress, progress_rows))
+                   if rows and (final or len(rows) >= batch_size)]
+        if batches:
+            with engine.begin() as conn:
+                for table, rows in batches:
+                    conn.execute(insert(table), rows)
+            for _, rows in batches:
+                rows.clear()
+
+    for user in users:
+        activity = min(rng.paretovariate(ACTIVITY_ALPHA), MAX_ACTIVITY)
+        log_probability = min(1.0, 0.3 * activity)
+        mean_entries = task["entries_per_day"] * activity ** 0.5
+        # Half the users were there from the start, the rest joined along the way
+        first_day = 0 if rng.random() < 0.5 else rng.randrange(days)
+        weight = user["weight"]
+        trend = {"lose": -0.05, "maintain": 0.0, "gain": 0.03}[user["goal"]]
+        user_id = user["user_id"]
+
+        for offset in range(first_day, days):
+            day = end - timedelta(days=days - 1 - offset)
+            calories_today = 0
+            if rng.random() < log_probability:
+                entries = max(1, round(rng.gauss(mean_entries, mean_entries / 3)))
+                totals = [0, 0.0, 0.0, 0.0]
+                for food_id, calories, protein, fat, carbohydrates in rng.choices(foods, cum_weights=cum_weights, k=entries):
+                    quantity = rng.choice(QUANTITIES)
+                    log = (int(calories * quantity), protein * quantity, fat * quantity, carbohydrates * quantity)
+                    food_logs.append({
+                        "user_id": user_id, "food_id": food_id, "date": day, "quantity": quantity,
+                        "calories": log[0], "protein": log[1], "fat": log[2], "carbohydrates": log[3]
+                    })
+                    totals = [total + value for total, value in zip(totals, log)]
+                # The rollup is written directly rather than rebuilt afterwards
+                daily_rows.append({
+                    "user_id": user_id, "date": day, "calories": totals[0], "protein": totals[1],
+                    "fat": totals[2], "carbohydrates": totals[3], "entry_count": entries
+                })
+                counts["food_logs"] += entries
+                calories_today = totals[0]
+
+            weight += trend + rng.gauss(0, 0.15)
+            if (days - 1 - offset) % task["progress_every"] == 0:
+                weight = max(40.0, weight)
+                progress_rows.append({
+                    "user_id": user_id, "date": day, "weight": round(weight, 1),
+                    "bmi": round(weight / (user["height"] / 100) ** 2, 1), "calorie_intake": calories_today
+                })
+                counts["progress"] += 1
+        flush()
+    flush(final=True)
+    return counts
+
+def generate_dataset(
+    users: int,
+    days: int,
+    entries_per_day: float = 3.0,
+    foods: int = 0,
+    workers: int = 1,
+    seed: int = 0,
+    progress_every: int = 7,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    end_date: Optional[date] = None,
+    on_chunk: Optional[Callable[[GenerationStats], None]] = None
+) -> GenerationStats:
+    """
+    Fill users, foods, food_logs, daily_nutrition and progress with
+    synthetic data. New users are appended after the highest existing id,
+    so the generator can be run repeatedly against the same database.
+    """
+    db = SessionLocal()
+    try:
+        if foods:
+            catalog = synthetic_foods(foods, seed)
+            for start in range(0, len(catalog), DEFAULT_BATCH_SIZE):
+                insert_missing_foods(db, catalog[start:start + DEFAULT_BATCH_SIZE])
+                db.commit()
+            logger.info("Added missing foods from %d synthetic foods", len(catalog))
+        first_user_id = (db.execute(select(func.max(User.user_id))).scalar() or 0) + 1
+    finally:
+        db.close()
+
+    # bcrypt is slow by design; every account shares one hash
+    password_hash = get_password_hash(SYNTHETIC_PASSWORD)
+    tasks = [{
+        "first_user_id": first_user_id + start,
+        "users": min(CHUNK_USERS, users - start),
+        "days": days,
+        "entries_per_day": entries_per_day,
+        "progress_every": progress_every,
+        "batch_size": batch_size,
+        "end_date": end_date or date.today(),
+        "password_hash": password_hash,
+        "seed": seed
+    } for start in range(0, users, CHUNK_USERS)]
+
+    stats = GenerationStats()
+    if workers > 1:
+        # Spawned workers open their own engine from the same settings
+        get_engine().dispose()
+        with multiprocessing.get_context("spawn").Pool(workers) as pool:
+            for chunk in pool.imap_unordered(generate_chunk, tasks):
+                stats.add(chunk)
+                if on_chunk:
+                    on_chunk(stats)
+    else:
+        for task in tasks:
+            stats.add(generate_chunk(task))
+            if on_chunk:
+                on_chunk(stats)
+    return stats
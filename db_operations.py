@@ -1,28 +1,21 @@
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from datetime import datetime, date, timedelta
-from passlib.context import CryptContext
 from jose import JWTError, jwt
 from fastapi import HTTPException, status
 from typing import Optional, List, Dict, Any
 
 from models import User, Food, FoodLog, Progress
 from schemas import UserCreate, FoodLogCreate, ProgressCreate, UserUpdate
-
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from password_hashing import verify_password, get_password_hash
+from rollups import bump_daily_nutrition, insert_progress_stmt, refresh_progress_intake
+from food_import import insert_missing_foods, parse_food
 
 # JWT settings
 SECRET_KEY = "your-secret-key-here"  # Change this in production
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
-
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -114,30 +107,41 @@ def create_food_log(db: Session, food_log: FoodLogCreate) -> FoodLog:
             detail="Food not found"
         )
     
+    nutrition = {
+        "calories": int(food.calories * food_log.quantity),
+        "protein": food.protein * food_log.quantity,
+        "fat": food.fat * food_log.quantity,
+        "carbohydrates": food.carbohydrates * food_log.quantity
+    }
     db_food_log = FoodLog(
         user_id=food_log.user_id,
         food_id=food_log.food_id,
         date=food_log.date,
         quantity=food_log.quantity,
-        calories=int(food.calories * food_log.quantity),
-        protein=food.protein * food_log.quantity,
-        fat=food.fat * food_log.quantity,
-        carbohydrates=food.carbohydrates * food_log.quantity
+        **nutrition
     )
     db.add(db_food_log)
+    day = {"user_id": food_log.user_id, "date": food_log.date, **nutrition}
+    bump_daily_nutrition(db, [day])
+    refresh_progress_intake(db, [day])
     db.commit()
     db.refresh(db_food_log)
     return db_food_log
 
-def get_user_foodlogs(db: Session, user_id: int) -> List[FoodLog]:
+def get_user_foodlogs(db: Session, user_id: int, start: Optional[date] = None, end: Optional[date] = None) -> List[FoodLog]:
     # Join with Food table to get food names
-    foodlogs = db.query(
+    query = db.query(
         FoodLog, Food.name.label("food_name")
     ).join(
         Food, FoodLog.food_id == Food.food_id
     ).filter(
         FoodLog.user_id == user_id
-    ).all()
+    )
+    if start is not None:
+        query = query.filter(FoodLog.date >= start)
+    if end is not None:
+        query = query.filter(FoodLog.date <= end)
+    foodlogs = query.order_by(FoodLog.date, FoodLog.foodlog_id).all()
     
     # Convert to list of dictionaries with food names included
     result = []
@@ -160,11 +164,10 @@ def get_user_foodlogs(db: Session, user_id: int) -> List[FoodLog]:
 
 # Progress operations
 def create_progress(db: Session, progress: ProgressCreate) -> Progress:
-    db_progress = Progress(**progress.dict())
-    db.add(db_progress)
+    # Intake comes from the food log in the same statement as the insert
+    progress_id = db.execute(insert_progress_stmt(progress)).lastrowid
     db.commit()
-    db.refresh(db_progress)
-    return db_progress
+    return db.get(Progress, progress_id)
 
 def get_user_progress(db: Session, user_id: int) -> List[Progress]:
     return db.query(Progress).filter(Progress.user_id == user_id).all()
@@ -203,9 +206,7 @@ def seed_foods(db: Session):
     {"name": "Pineapple", "calories": 82, "protein": 0.9, "fat": 0.2, "carbohydrates": 22}
 ]
 
-    for food in foods:
-        existing = db.query(Food).filter(Food.name == food["name"]).first()
-        if not existing:
-            db_food = Food(**food)
-            db.add(db_food)
+    # One batched insert keyed on the normalized name instead of a lookup per
+    # food; foods already in the catalog, imported or edited, are left alone
+    insert_missing_foods(db, [parse_food(food) for food in foods])
     db.commit() 
\ No newline at end of file
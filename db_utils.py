@@ -0,0 +1,149 @@
+from typing import List, Dict, Any, Sequence, Tuple
+from datetime import date
+
+from sqlalchemy import Table, Float, Date, Integer, insert, select, literal, cast, func, text
+from sqlalchemy.dialects import mysql, sqlite, postgresql
+from fastapi import HTTPException, status
+
+from models import Food, FoodLog
+
+def _dialect_insert(dialect_name: str, table: Table):
+    if dialect_name == "mysql":
+        return mysql.insert(table)
+    if dialect_name == "sqlite":
+        return sqlite.insert(table)
+    if dialect_name == "postgresql":
+        return postgresql.insert(table)
+    raise NotImplementedError(f"Upserts are not supported on {dialect_name}")
+
+def upsert_increment_stmt(
+    dialect_name: str,
+    table: Table,
+    rows: List[Dict[str, Any]],
+    key_columns: Sequence[str],
+    increment_columns: Sequence[str]
+):
+    """
+    Multi-row INSERT that adds to the existing values of increment_columns
+    when a row with the same key_columns already exists.
+    """
+    stmt = _dialect_insert(dialect_name, table).values(rows)
+    if dialect_name == "mysql":
+        return stmt.on_duplicate_key_update(
+            {col: table.c[col] + stmt.inserted[col] for col in increment_columns}
+        )
+    return stmt.on_conflict_do_update(
+        index_elements=list(key_columns),
+        set_={col: table.c[col] + stmt.excluded[col] for col in increment_columns}
+    )
+
+def upsert_stmt(
+    dialect_name: str,
+    table: Table,
+    key_columns: Sequence[str],
+    update_columns: Sequence[str]
+):
+    """
+    INSERT that overwrites update_columns when a row with the same
+    key_columns already exists. Execute it with a list of rows as the
+    parameters so the driver batches them.
+    """
+    stmt = _dialect_insert(dialect_name, table)
+    if dialect_name == "mysql":
+        return stmt.on_duplicate_key_update({col: stmt.inserted[col] for col in update_columns})
+    return stmt.on_conflict_do_update(
+        index_elements=list(key_columns),
+        set_={col: stmt.excluded[col] for col in update_columns}
+    )
+
+def insert_missing_stmt(dialect_name: str, table: Table, key_columns: Sequence[str]):
+    """
+    INSERT that leaves a row with the same key_columns untouched. Unlike
+    INSERT IGNORE on MySQL, other errors still raise.
+    """
+    stmt = _dialect_insert(dialect_name, table)
+    if dialect_name == "mysql":
+        # A no-op update is MySQL's only per-key "do nothing"
+        return stmt.on_duplicate_key_update({key_columns[0]: table.c[key_columns[0]]})
+    return stmt.on_conflict_do_nothing(index_elements=list(key_columns))
+
+# Engine URL -> whether its MySQL server hands a multi-row INSERT one
+# consecutive block of ids
+_consecutive_ids: Dict[str, bool] = {}
+
+def _has_consecutive_ids(db) -> bool:
+    """
+    lastrowid + i is the id of row i only when auto_increment_increment is
+    1 (Galera and group replication raise it) and innodb_autoinc_lock_mode
+    is 0 or 1; in mode 2, concurrent inserts may interleave their ids.
+    Checked once per engine.
+    """
+    url = str(db.get_bind().engine.url)
+    consecutive = _consecutive_ids.get(url)
+    if consecutive is None:
+        increment, lock_mode = db.execute(
+            text("SELECT @@auto_increment_increment, @@innodb_autoinc_lock_mode")
+        ).one()
+        consecutive = _consecutive_ids[url] = int(increment) == 1 and int(lock_mode) in (0, 1)
+    return consecutive
+
+def insert_rows_returning_ids(db, table: Table, rows: List[Dict[str, Any]]) -> List[int]:
+    """
+    Insert rows and return their new primary keys in the same order as
+    rows. One multi-row INSERT where the ids can be known from it, otherwise
+    one INSERT per row. Takes a sync Session; async callers go through
+    AsyncSession.run_sync.
+    """
+    pk = table.primary_key.columns.values()[0]
+    dialect = db.get_bind().dialect
+
+    # Auto-increment ids are assigned in VALUES order within one statement,
+    # so sorting the returned ids lines them up with rows
+    if dialect.insert_returning:
+        return sorted(db.execute(insert(table).values(rows).returning(pk)).scalars())
+
+    # MySQL has no RETURNING. A multi-row INSERT reports the id of its first
+    # row, and the rest follow it only under the settings checked above.
+    if _has_consecutive_ids(db):
+        first_id = db.execute(insert(table).values(rows)).lastrowid
+        return list(range(first_id, first_id + len(rows)))
+    return [db.execute(insert(table).values(row)).lastrowid for row in rows]
+
+def insert_food_log_from_food(dialect_name: str, food_log):
+    """
+    INSERT ... SELECT that computes a food log's nutrition from its foods
+    row, so the food lookup and the insert are a single statement. Inserts
+    nothing when the food does not exist.
+    """
+    quantity = literal(food_log.quantity, Float)
+    calories = Food.calories * quantity
+    # Match int() truncation: SQLite's CAST truncates, other databases round
+    if dialect_name != "sqlite":
+        calories = func.floor(calories)
+    food_select = select(
+        literal(food_log.user_id, Integer),
+        Food.food_id,
+        literal(food_log.date, Date),
+        quantity,
+        cast(calories, Integer),
+        Food.protein * quantity,
+        Food.fat * quantity,
+        Food.carbohydrates * quantity
+    ).where(Food.food_id == food_log.food_id)
+    return insert(FoodLog).from_select(
+        ["user_id", "food_id", "date", "quantity", "calories", "protein", "fat", "carbohydrates"],
+        food_select
+    )
+
+def encode_foodlog_cursor(log_date: date, foodlog_id: int) -> str:
+    return f"{log_date.isoformat()}_{foodlog_id}"
+
+def decode_foodlog_cursor(cursor: str) -> Tuple[date, int]:
+    try:
+        log_date, foodlog_id = cursor.split("_", 1)
+        return date.fromisoformat(log_date), int(foodlog_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
@@ -1,4 +1,4 @@
-import requests
+from api_client import http
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QFormLayout, QLineEdit, QComboBox, 
     QPushButton, QMessageBox, QLabel, QFrame, QGridLayout, 
@@ -160,7 +160,7 @@ class EditProfileWidget(QWidget):
             headers = {"Authorization": f"Bearer {self.token}"}
             
             # Send update request
-            r = requests.put(f"{API_URL}/users/{self.user['user_id']}", json=data, headers=headers)
+            r = http.put(f"{API_URL}/users/{self.user['user_id']}", json=data, headers=headers)
             
             if r.status_code == 200:
                 QMessageBox.information(self, "Success", "Profile updated successfully!")
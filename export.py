@@ -0,0 +1,85 @@
+from datetime import date
+from sqlalchemy import select
+from typing import Any, AsyncIterator, Dict, Iterable, Optional
+import csv
+import io
+import json
+import logging
+
+from models import Food, Progress
+from async_database import get_archive_cutoff, read_session
+from partitions import with_archive
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched from the server-side cursor per round trip, and so per chunk
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# CSV header covering both record types; unused columns stay empty
+CSV_COLUMNS = [
+    "record_type", "date",
+    "foodlog_id", "food_id", "food_name", "quantity", "calories", "protein", "fat", "carbohydrates",
+    "progress_id", "weight", "bmi", "calorie_intake",
+]
+
+def _foodlogs_select(user_id: int, archived_before: Optional[date] = None):
+    def from_table(table):
+        return select(
+            table.c.foodlog_id, table.c.date, table.c.food_id, Food.name.label("food_name"),
+            table.c.quantity, table.c.calories, table.c.protein, table.c.fat, table.c.carbohydrates
+        ).outerjoin(
+            Food, table.c.food_id == Food.food_id
+        ).where(
+            table.c.user_id == user_id
+        )
+    # The whole history, archived logs included
+    return with_archive(from_table, archived_before).order_by("date", "foodlog_id")
+
+def _progress_select(user_id: int):
+    return select(
+        Progress.progress_id, Progress.date, Progress.weight, Progress.bmi, Progress.calorie_intake
+    ).where(
+        Progress.user_id == user_id
+    ).order_by(Progress.date, Progress.progress_id)
+
+def _ndjson_chunk(record_type: str, rows: Iterable[Dict[str, Any]]) -> bytes:
+    lines = []
+    for row in rows:
+        record = {"record_type": record_type, **row, "date": row["date"].isoformat()}
+        lines.append(json.dumps(record, separators=(",", ":")))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+def _csv_chunk(record_type: str, rows: Iterable[Dict[str, Any]]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, lineterminator="\n")
+    for row in rows:
+        writer.writerow({"record_type": record_type, **row})
+    return buffer.getvalue().encode("utf-8")
+
+async def stream_user_export(user_id: int, fmt: str, primary: bool = False) -> AsyncIterator[bytes]:
+    """
+    Yield a user's food logs, then their progress records, as NDJSON or CSV
+    chunks. Rows come off a server-side cursor one batch at a time, so
+    memory stays flat however long the history is.
+
+    The generator owns its session because it keeps reading after the
+    endpoint has returned. It reads a replica unless primary is set.
+    """
+    if fmt == "csv":
+        yield (",".join(CSV_COLUMNS) + "\n").encode("utf-8")
+    encode = _csv_chunk if fmt == "csv" else _ndjson_chunk
+
+    rows_sent = 0
+    async with read_session(primary) as db:
+        foodlogs = _foodlogs_select(user_id, await get_archive_cutoff(db))
+        for record_type, query in (("foodlog", foodlogs), ("progress", _progress_select(user_id))):
+            result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+            async for partition in result.mappings().partitions():
+                rows_sent += len(partition)
+                yield encode(record_type, partition)
+    logger.info("Exported %s rows for user %s as %s", rows_sent, user_id, fmt)
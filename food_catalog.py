@@ -0,0 +1,118 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import orjson
+import os
+import time
+
+from models import Food
+
+# Rebuild the snapshot at least this often, so changes made by other
+# workers or CLI imports show up without a restart
+FOOD_CATALOG_MAX_AGE = float(os.getenv("FOOD_CATALOG_MAX_AGE", "300"))
+
+# Bound on distinct (skip, limit) slices kept encoded per snapshot
+MAX_MEMOIZED_PAGES = 64
+
+FOOD_FIELDS = ("food_id", "name", "calories", "protein", "fat", "carbohydrates")
+
+def _encode(foods: List[dict]) -> bytes:
+    return orjson.dumps(foods)
+
+class CatalogSnapshot:
+    """
+    Immutable copy of the foods table with its JSON body pre-serialized.
+    The ETag is derived from the content, so every worker serving the same
+    catalog hands out the same tag.
+    """
+
+    def __init__(self, foods: List[dict], version: int = 0):
+        self.version = version
+        self.foods = foods
+        self.built_at = time.monotonic()
+        self.body = _encode(foods)
+        self.content_hash = hashlib.sha256(self.body).hexdigest()[:32]
+        self._pages: Dict[Tuple[int, int], bytes] = {}
+
+    def etag(self, skip: int = 0, limit: Optional[int] = None) -> str:
+        if skip == 0 and (limit is None or limit >= len(self.foods)):
+            return f'"{self.content_hash}"'
+        return f'"{self.content_hash}-{skip}-{limit}"'
+
+    def page(self, skip: int = 0, limit: Optional[int] = None) -> bytes:
+        # The full catalog is the common case and is encoded once up front;
+        # other slices are encoded on first request and memoized
+        if skip == 0 and (limit is None or limit >= len(self.foods)):
+            return self.body
+        key = (skip, limit)
+        body = self._pages.get(key)
+        if body is None:
+            end = None if limit is None else skip + limit
+            body = _encode(self.foods[skip:end])
+            if len(self._pages) < MAX_MEMOIZED_PAGES:
+                self._pages[key] = body
+        return body
+
+def _build_snapshot(rows) -> CatalogSnapshot:
+    return CatalogSnapshot([dict(zip(FOOD_FIELDS, row)) for row in rows])
+
+class FoodCatalog:
+    def __init__(self, max_age: float = FOOD_CATALOG_MAX_AGE):
+        self.max_age = max_age
+        self.version = 0
+        self._content_hash: Optional[str] = None
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = asyncio.Lock()
+        # Bumped on every invalidation so a rebuild that raced with a
+        # mutation is not kept as the current snapshot
+        self._generation = 0
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._snapshot is not None
+            and time.monotonic() - self._snapshot.built_at < self.max_age
+        )
+
+    async def get(self, db: AsyncSession) -> CatalogSnapshot:
+        if self._is_fresh():
+            return self._snapshot
+        async with self._lock:
+            # Another request may have rebuilt it while we waited
+            if not self._is_fresh():
+                return await self.rebuild(db)
+        return self._snapshot
+
+    async def rebuild(self, db: AsyncSession) -> CatalogSnapshot:
+        generation = self._generation
+        result = await db.execute(
+            select(*[getattr(Food, field) for field in FOOD_FIELDS]).order_by(Food.food_id)
+        )
+        rows = result.all()
+        # Encoding and hashing a large catalog takes a while, so keep it off
+        # the event loop
+        snapshot = await run_in_threadpool(_build_snapshot, rows)
+        # Unchanged content keeps its version, so the search index and
+        # clients' ETags stay valid across periodic rebuilds
+        if snapshot.content_hash != self._content_hash:
+            self.version += 1
+            self._content_hash = snapshot.content_hash
+        snapshot.version = self.version
+        if generation == self._generation:
+            self._snapshot = snapshot
+        return snapshot
+
+    def invalidate(self) -> None:
+        # Called after seeding or any other food mutation
+        self._generation += 1
+        self._snapshot = None
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+food_catalog = FoodCatalog()
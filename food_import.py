@@ -0,0 +1,194 @@
+from sqlalchemy import inspect, select, text, update, bindparam
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+import csv
+import gzip
+import json
+import logging
+import time
+
+from models import Food
+from db_utils import insert_missing_stmt, upsert_stmt
+from food_names import NAME_LENGTH, name_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 5000
+
+# Column names used by common nutrition exports, e.g. USDA FoodData Central
+FIELD_ALIASES = {
+    "name": ("name", "description", "food_name", "product_name"),
+    "calories": ("calories", "energy_kcal", "energy", "kcal"),
+    "protein": ("protein", "protein_g"),
+    "fat": ("fat", "total_lipid", "total_fat", "fat_g"),
+    "carbohydrates": ("carbohydrates", "carbohydrate", "carbs", "carbohydrate_by_difference", "carbohydrates_g"),
+}
+
+def _open(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+def read_records(path: str, fmt: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Stream records from a CSV or NDJSON file, optionally gzipped, one at a
+    time. The format is taken from the file extension unless given.
+    """
+    if fmt is None:
+        stem = path[:-3] if path.endswith(".gz") else path
+        fmt = "ndjson" if stem.endswith((".ndjson", ".jsonl", ".json")) else "csv"
+    with _open(path) as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        elif fmt == "ndjson":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            raise ValueError(f"Unsupported format: {fmt}")
+
+def _field(record: Dict[str, Any], field: str) -> Any:
+    for alias in FIELD_ALIASES[field]:
+        value = record.get(alias)
+        if value not in (None, ""):
+            return value
+    return None
+
+def parse_food(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # Returns a foods row, or None when the record is unusable
+    name = _field(record, "name")
+    if name is None:
+        return None
+    name = str(name).strip()[:NAME_LENGTH]
+    key = name_key(name)
+    if not key:
+        return None
+    try:
+        return {
+            "name": name,
+            "name_key": key,
+            "calories": int(round(float(_field(record, "calories") or 0))),
+            "protein": float(_field(record, "protein") or 0),
+            "fat": float(_field(record, "fat") or 0),
+            "carbohydrates": float(_field(record, "carbohydrates") or 0)
+        }
+    except (TypeError, ValueError):
+        return None
+
+def upsert_foods(db: Session, foods: List[Dict[str, Any]]) -> None:
+    """
+    Insert foods, overwriting the nutrition values of foods that already
+    exist under the same name_key. Rows are sent as one executemany call,
+    which the drivers batch into multi-row statements.
+    """
+    stmt = upsert_stmt(
+        db.get_bind().dialect.name,
+        Food.__table__,
+        key_columns=("name_key",),
+        update_columns=("name", "calories", "protein", "fat", "carbohydrates")
+    )
+    db.execute(stmt, foods)
+
+def insert_missing_foods(db: Session, foods: List[Dict[str, Any]]) -> None:
+    """
+    Insert the foods whose name_key is not in the catalog yet, leaving
+    existing foods and their nutrition values as they are.
+    """
+    stmt = insert_missing_stmt(db.get_bind().dialect.name, Food.__table__, key_columns=("name_key",))
+    db.execute(stmt, foods)
+
+class ImportStats:
+    def __init__(self):
+        self.read = 0
+        self.skipped = 0
+        self.upserted = 0
+        self.batches = 0
+        self.started_at = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.read} rows read, {self.upserted} foods upserted, {self.skipped} skipped "
+            f"in {self.elapsed:.1f}s ({self.rows_per_second:,.0f} rows/s)"
+        )
+
+def import_foods(
+    db: Session,
+    records: Iterable[Dict[str, Any]],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    on_batch: Optional[Callable[[ImportStats], None]] = None
+) -> ImportStats:
+    """
+    Upsert a stream of raw records into foods, committing every batch_size
+    distinct foods. Re-running the same import leaves the table unchanged.
+    """
+    stats = ImportStats()
+    # name_key -> row; later records for the same food win within a batch
+    batch: Dict[str, Dict[str, Any]] = {}
+
+    def flush():
+        upsert_foods(db, list(batch.values()))
+        db.commit()
+        stats.upserted += len(batch)
+        stats.batches += 1
+        batch.clear()
+        if on_batch:
+            on_batch(stats)
+
+    for record in records:
+        stats.read += 1
+        food = parse_food(record)
+        if food is None:
+            stats.skipped += 1
+            continue
+        batch[food["name_key"]] = food
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    logger.info("Food import finished: %s", stats)
+    return stats
+
+def ensure_name_keys(conn: Connection) -> None:
+    """
+    Bring a foods table created before name_key existed up to date: add the
+    column, fill it in for existing rows and create its unique index.
+    """
+    columns = {column["name"] for column in inspect(conn).get_columns("foods")}
+    if "name_key" not in columns:
+        logger.info("Adding foods.name_key column")
+        conn.execute(text(f"ALTER TABLE foods ADD COLUMN name_key VARCHAR({NAME_LENGTH})"))
+
+    foods = Food.__table__
+    missing = conn.execute(
+        select(Food.food_id, Food.name).where(Food.name_key.is_(None)).order_by(Food.food_id)
+    ).all()
+    if missing:
+        # The oldest food keeps the key when existing names collide
+        taken = set(conn.execute(select(Food.name_key).where(Food.name_key.is_not(None))).scalars())
+        updates = []
+        for food_id, name in missing:
+            key = name_key(name)
+            if key and key not in taken:
+                taken.add(key)
+                updates.append({"id": food_id, "key": key})
+        if updates:
+            conn.execute(
+                update(foods).where(foods.c.food_id == bindparam("id")).values(name_key=bindparam("key")),
+                updates
+            )
+        logger.info("Backfilled name_key for %d foods", len(updates))
+
+    index_names = {index["name"] for index in inspect(conn).get_indexes("foods")}
+    if "ux_foods_name_key" not in index_names:
+        index = next(index for index in Food.__table__.indexes if index.name == "ux_foods_name_key")
+        index.create(conn)
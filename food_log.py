@@ -1,14 +1,20 @@
-import requests
+from api_client import http
 import json
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QComboBox, QLineEdit, QDateEdit, QPushButton, 
     QMessageBox, QLabel, QHBoxLayout, QScrollArea, QTabWidget, QTableWidget,
     QTableWidgetItem, QHeaderView
 )
-from PyQt5.QtCore import QDate, Qt
+from PyQt5.QtCore import QDate, Qt, QTimer
 
 API_URL = "http://127.0.0.1:8000"
 
+# Wait this long after the last keystroke before querying /foods/search
+SEARCH_DEBOUNCE_MS = 250
+
+# Last food catalog fetched and its ETag, shared by every FoodLogWidget
+_food_catalog_cache = {"etag": None, "foods": None}
+
 class FoodLogWidget(QWidget):
     def __init__(self, user, back_callback):
         super().__init__()
@@ -65,16 +71,29 @@ class FoodLogWidget(QWidget):
         scroll_content = QWidget()
         self.foods_layout = QVBoxLayout(scroll_content)
         
+        # Entries added to the form, submitted together by "Submit all"
+        self.entries = []
+        
+        # Every food seen so far, from the catalog or from search results
+        self.foods_by_id = {}
+        
         # Add button to add food entries
         add_btn = QPushButton("+ Add Food")
         add_btn.clicked.connect(self.add_food_entry)
         
+        # Submit every entry in a single request
+        submit_all_btn = QPushButton("Submit all")
+        submit_all_btn.clicked.connect(self.submit_all_logs)
+        
         # Set up scroll area
         scroll_area.setWidget(scroll_content)
         
         # Add widgets to layout
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addWidget(add_btn)
+        buttons_layout.addWidget(submit_all_btn)
         layout.addWidget(scroll_area)
-        layout.addWidget(add_btn)
+        layout.addLayout(buttons_layout)
         
         # Set layout for the tab
         self.add_food_tab.setLayout(layout)
@@ -119,15 +138,24 @@ class FoodLogWidget(QWidget):
             # Set up headers with token
             headers = {"Authorization": f"Bearer {self.token}"}
             
-            # Make request to get food logs
+            # Make request to get food logs, following the next-page cursor
             url = f"{API_URL}/users/{user_id}/foodlogs"
             print(f"Fetching food logs from: {url}")
-            r = requests.get(url, headers=headers)
+            food_logs = []
+            params = {"limit": 1000}
+            while True:
+                r = http.get(url, params=params, headers=headers)
+                if r.status_code != 200:
+                    break
+                food_logs.extend(r.json())
+                next_cursor = r.headers.get("X-Next-Cursor")
+                if not next_cursor:
+                    break
+                params["cursor"] = next_cursor
             
             print(f"Food logs response status: {r.status_code}")
             
             if r.status_code == 200:
-                food_logs = r.json()
                 print(f"Received {len(food_logs)} food logs")
                 
                 # Clear table
@@ -165,6 +193,13 @@ class FoodLogWidget(QWidget):
         entry_widget = QWidget()
         entry_layout = QVBoxLayout(entry_widget)
         
+        # Search box narrowing the food dropdown
+        search_input = QLineEdit()
+        search_input.setPlaceholderText("Search foods...")
+        search_timer = QTimer(entry_widget)
+        search_timer.setSingleShot(True)
+        search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        
         # Food dropdown
         food_dropdown = QComboBox()
         food_dropdown.setEnabled(False)  # Initially disabled
@@ -183,6 +218,7 @@ class FoodLogWidget(QWidget):
         
         # Add widgets to entry layout
         entry_layout.addWidget(QLabel("Food:"))
+        entry_layout.addWidget(search_input)
         entry_layout.addWidget(food_dropdown)
         entry_layout.addWidget(QLabel("Quantity (units):"))
         entry_layout.addWidget(quantity_input)
@@ -203,6 +239,7 @@ class FoodLogWidget(QWidget):
         # Store references to form elements
         entry = {
             'widget': entry_widget,
+            'search_input': search_input,
             'food_dropdown': food_dropdown,
             'quantity_input': quantity_input,
             'calories_label': calories_label,
@@ -211,7 +248,11 @@ class FoodLogWidget(QWidget):
             'carb_label': carb_label,
         }
         
+        self.entries.append(entry)
+        
         # Connect signals
+        search_input.textChanged.connect(search_timer.start)
+        search_timer.timeout.connect(lambda: self.search_foods(entry))
         food_dropdown.currentIndexChanged.connect(lambda: self.update_nutrition_labels(entry))
         quantity_input.textChanged.connect(lambda: self.update_nutrition_labels(entry))
         submit_btn.clicked.connect(lambda: self.submit_log(entry))
@@ -223,12 +264,30 @@ class FoodLogWidget(QWidget):
         else:
             print("Foods not loaded yet, dropdown will be populated when foods are loaded")
     
-    def populate_food_dropdown(self, dropdown):
+    def populate_food_dropdown(self, dropdown, foods=None):
         dropdown.clear()
-        for food in self.foods:
+        for food in self.foods if foods is None else foods:
             dropdown.addItem(food["name"], food["food_id"])
         dropdown.setEnabled(True)
 
+    def search_foods(self, entry):
+        query = entry['search_input'].text().strip()
+        if not query:
+            # Empty search shows the whole catalog again
+            if getattr(self, 'foods', None):
+                self.populate_food_dropdown(entry['food_dropdown'])
+            return
+        try:
+            r = http.get(f"{API_URL}/foods/search", params={"q": query, "limit": 20})
+            if r.status_code == 200:
+                foods = r.json()
+                self.foods_by_id.update({food["food_id"]: food for food in foods})
+                self.populate_food_dropdown(entry['food_dropdown'], foods)
+            else:
+                print(f"Food search failed with status: {r.status_code}")
+        except Exception as e:
+            print(f"Exception searching foods: {str(e)}")
+
     def load_foods(self):
         try:
             # Set up headers with token
@@ -236,9 +295,17 @@ class FoodLogWidget(QWidget):
             if self.token:
                 headers["Authorization"] = f"Bearer {self.token}"
                 
-            r = requests.get(f"{API_URL}/foods", headers=headers)
-            if r.status_code == 200:
-                self.foods = r.json()
+            # Revalidate the cached catalog instead of downloading it again
+            if _food_catalog_cache["etag"]:
+                headers["If-None-Match"] = _food_catalog_cache["etag"]
+                
+            r = http.get(f"{API_URL}/foods", headers=headers)
+            if r.status_code in (200, 304):
+                if r.status_code == 200:
+                    _food_catalog_cache["foods"] = r.json()
+                    _food_catalog_cache["etag"] = r.headers.get("ETag")
+                self.foods = _food_catalog_cache["foods"]
+                self.foods_by_id.update({food["food_id"]: food for food in self.foods})
                 
                 # Check if foods_layout exists before trying to access it
                 if hasattr(self, 'foods_layout'):
@@ -260,16 +327,15 @@ class FoodLogWidget(QWidget):
             QMessageBox.critical(self, "Error", f"Exception loading foods: {str(e)}")
 
     def update_nutrition_labels(self, entry):
-        dropdown = entry['food_dropdown']
-        idx = dropdown.currentIndex()
-        if idx < 0 or not self.foods:
+        # The dropdown may hold search results, so look the food up by id
+        food = self.foods_by_id.get(entry['food_dropdown'].currentData())
+        if food is None:
             entry['calories_label'].setText("Calories: -")
             entry['protein_label'].setText("Protein: -")
             entry['fat_label'].setText("Fat: -")
             entry['carb_label'].setText("Carb: -")
             return
         
-        food = self.foods[idx]
         try:
             quantity = float(entry['quantity_input'].text()) if entry['quantity_input'].text() else 1
         except ValueError:
@@ -325,7 +391,7 @@ class FoodLogWidget(QWidget):
             print(f"Using authorization token: {self.token[:10]}...")
                 
             print(f"Making POST request to {API_URL}/foodlogs")
-            r = requests.post(f"{API_URL}/foodlogs", json=data, headers=headers)
+            r = http.post(f"{API_URL}/foodlogs", json=data, headers=headers)
             
             print(f"Response status code: {r.status_code}")
             print(f"Response headers: {r.headers}")
@@ -371,4 +437,65 @@ class FoodLogWidget(QWidget):
                 QMessageBox.warning(self, "Error", f"Status: {r.status_code}, Detail: {error_detail}")
         except Exception as e:
             print(f"Exception in submit_log: {str(e)}")
-            QMessageBox.critical(self, "Error", str(e)) 
\ No newline at end of file
+            QMessageBox.critical(self, "Error", str(e))
+
+    def submit_all_logs(self):
+        date = self.date_picker.date().toString("yyyy-MM-dd")
+        user_id = self.user.get("user_id")
+        if not user_id:
+            QMessageBox.critical(self, "Error", "User ID not found in the user data. Please log out and log in again.")
+            return
+        if not self.token:
+            QMessageBox.critical(self, "Authentication Error", "Authentication token is missing. Please log out and log in again.")
+            return
+        
+        # Collect every entry that has both a food and a quantity
+        data = []
+        for entry in self.entries:
+            food_id = entry['food_dropdown'].currentData()
+            quantity = entry['quantity_input'].text()
+            if not food_id or not quantity:
+                continue
+            try:
+                quantity = float(quantity)
+            except ValueError:
+                QMessageBox.warning(self, "Validation Error", f"Invalid quantity: {quantity}")
+                return
+            data.append({
+                "user_id": user_id,
+                "food_id": food_id,
+                "quantity": quantity,
+                "date": date
+            })
+        
+        if not data:
+            QMessageBox.warning(self, "Validation Error", "Please select a food and enter quantity")
+            return
+        
+        try:
+            headers = {"Authorization": f"Bearer {self.token}"}
+            print(f"Submitting {len(data)} food logs to {API_URL}/foodlogs/batch")
+            r = http.post(f"{API_URL}/foodlogs/batch", json=data, headers=headers)
+            
+            if r.status_code == 201:
+                QMessageBox.information(self, "Success", f"{len(data)} food logs submitted!")
+                # Clear the forms for reuse
+                for entry in self.entries:
+                    entry['quantity_input'].clear()
+                    entry['food_dropdown'].setCurrentIndex(0)
+                    self.update_nutrition_labels(entry)
+                
+                # Switch to View Logs tab and refresh logs
+                self.tabs.setCurrentIndex(1)
+                self.load_food_logs()
+            elif r.status_code == 401:
+                QMessageBox.warning(self, "Authentication Error", "Authentication failed. Please log out and log in again.")
+            else:
+                try:
+                    error_detail = r.json().get("detail", "Failed to log food")
+                except Exception:
+                    error_detail = f"Failed to log food: {r.text}"
+                QMessageBox.warning(self, "Error", f"Status: {r.status_code}, Detail: {error_detail}")
+        except Exception as e:
+            print(f"Exception in submit_all_logs: {str(e)}")
+            QMessageBox.critical(self, "Error", str(e))
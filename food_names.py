@@ -0,0 +1,19 @@
+import re
+import unicodedata
+
+from models import Food
+
+NAME_LENGTH = Food.__table__.c.name.type.length
+
+_non_alnum = re.compile(r"[^a-z0-9]+")
+
+def normalize(text: str) -> str:
+    # Lowercase, strip accents and collapse punctuation to single spaces
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _non_alnum.sub(" ", text.lower()).strip()
+
+def name_key(name: str) -> str:
+    # Foods differing only in case, accents or punctuation are the same food
+    return normalize(name)[:NAME_LENGTH]
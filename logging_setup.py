@@ -0,0 +1,165 @@
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+import atexit
+import datetime
+import logging
+import os
+import queue
+import random
+import sys
+
+import orjson
+
+# Root level, plus per-logger overrides, e.g. LOG_LEVELS="async_database=WARNING,sql.slow=INFO"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# json for log shippers, text for a terminal
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Fraction of INFO and DEBUG records kept per logger prefix, e.g. "main=0.1";
+# warnings and errors are never sampled
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+# Records waiting for the writer thread; beyond this they are dropped, not waited on
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Message arguments the writer thread can render later and get the same text
+_IMMUTABLE_ARGS = (str, int, float, bool, type(None), bytes, datetime.date, datetime.timedelta)
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+def parse_settings(value: str) -> Dict[str, str]:
+    settings = {}
+    for part in value.split(","):
+        if "=" in part:
+            name, setting = part.split("=", 1)
+            settings[name.strip()] = setting.strip()
+    return settings
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a fraction of INFO and DEBUG records from the configured loggers.
+    The longest matching prefix wins and the decision is cached per logger.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._logger_rates: Dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._logger_rates.get(name)
+        if rate is None:
+            rate = 1.0
+            matched = -1
+            for prefix, prefix_rate in self.rates.items():
+                if (name == prefix or name.startswith(prefix + ".")) and len(prefix) > matched:
+                    rate, matched = prefix_rate, len(prefix)
+            self._logger_rates[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the writer thread as they are. The stock prepare()
+    formats the message on the caller's thread, which is the cost we want
+    off the request path; formatting happens in the listener instead.
+    Records whose arguments are not plain immutable values (lists, ORM
+    objects) are still formatted here, since those could change, or not
+    be safe to render, by the time the writer thread gets to them.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        if args and not (isinstance(args, tuple) and all(isinstance(arg, _IMMUTABLE_ARGS) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"queued": self.queue.qsize(), "dropped": self.dropped}
+
+_listener: Optional[QueueListener] = None
+_stream_handler: Optional[logging.Handler] = None
+queue_handler: Optional[NonBlockingQueueHandler] = None
+
+def configure_logging() -> None:
+    """
+    Route all logging through a bounded queue drained by one writer thread.
+    Safe to call more than once; later calls do nothing.
+    """
+    global _listener, _stream_handler, queue_handler
+    if _listener is not None:
+        return
+
+    _stream_handler = stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(JSONFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    rates = {name: float(rate) for name, rate in parse_settings(LOG_SAMPLE_RATES).items()}
+    if rates:
+        queue_handler.addFilter(SamplingFilter(rates))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL.upper())
+    for name, level in parse_settings(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener = QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stats() -> Dict[str, int]:
+    if queue_handler is None:
+        return {"queued": 0, "dropped": 0}
+    return queue_handler.stats()
+
+def stop_logging() -> None:
+    """
+    Flush whatever is still queued and stop the writer thread. Records
+    logged afterwards are written directly.
+    """
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    root = logging.getLogger()
+    root.removeHandler(queue_handler)
+    root.addHandler(_stream_handler)
+    if queue_handler.dropped:
+        root.warning("Dropped %d log records while the queue was full", queue_handler.dropped)
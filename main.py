@@ -1,42 +1,109 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Response, Query, Body
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+from datetime import date
 from jose import JWTError, jwt
 import logging
+import orjson
+import os
 
-from models import Base, engine, get_db, User
 from schemas import (
-    UserCreate, UserResponse, UserLogin, Token,
-    FoodResponse, FoodLogCreate, FoodLogResponse,
-    ProgressCreate, ProgressResponse, UserUpdate
+    UserCreate, UserResponse, Token,
+    FoodResponse, FoodLogCreate, FoodLogResponse, FoodLogDetailResponse,
+    ProgressCreate, ProgressResponse, UserUpdate,
+    DailyNutritionResponse
 )
-import database as db
-from db_operations import seed_foods
+import async_database as db
+from async_database import get_db, get_read_db
+from models import dispose_engines, get_async_engine, get_replica_engines
+from password_hashing import password_hasher
+from cache import TokenUserCache
+from food_catalog import food_catalog, etag_matches
+from food_search import search_foods
+from export import EXPORT_FORMATS, stream_user_export
+from serialization import rows_response
+from analytics import analytics_cache, downsample_rows, progress_analytics
+from rate_limit import cpu_admission, limit_by_ip, rate_limiter
+import metrics
+import sql_profiler
+import logging_setup
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
-
 app = FastAPI(title="Fitness Tracker API")
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+if sql_profiler.SQL_PROFILER_ENABLED:
+    app.add_middleware(sql_profiler.SQLProfilerMiddleware)
+
+# Create or upgrade the schema at startup. Set DB_AUTO_MIGRATE=0 when several
+# workers share a database and run `python manage.py migrate` once instead.
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "1") == "1"
+
+@app.on_event("startup")
+async def create_tables():
+    # JSON records written by a background thread, see logging_setup
+    logging_setup.configure_logging()
+    if DB_AUTO_MIGRATE:
+        await db.create_tables()
+    if metrics.METRICS_ENABLED:
+        metrics.instrument_pool(get_async_engine().sync_engine, "async")
+        for i, replica in enumerate(get_replica_engines()):
+            metrics.instrument_pool(replica.sync_engine, f"replica{i}")
+
+# Close pooled connections so async driver threads exit cleanly
+@app.on_event("shutdown")
+async def dispose_engine():
+    await dispose_engines()
+    password_hasher.shutdown()
+    logging_setup.stop_logging()
+
+# Upper bound on entries accepted by POST /foodlogs/batch
+MAX_FOODLOG_BATCH = 500
+
+# Upper bound on ?points=, the samples a series is downsampled to; a few
+# screen widths is already more than a chart can show
+MAX_SERIES_POINTS = 10000
 
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+# Verified token -> user snapshot, so authenticated requests skip the user lookup.
+# Entries expire with the token, or after TOKEN_CACHE_MAX_AGE seconds so other
+# workers pick up profile changes.
+token_cache = TokenUserCache(
+    maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("TOKEN_CACHE_MAX_AGE", "300"))
+)
+
+metrics.register_stats("password_hasher", "Password hashing process pool", password_hasher.stats)
+metrics.register_stats("token_cache", "Token to user snapshot cache", token_cache.stats)
+metrics.register_stats("analytics_cache", "Per-user progress analytics responses", analytics_cache.stats)
+metrics.register_stats("rate_limits", "Rate limit keys tracked, requests allowed and refused per policy", rate_limiter.stats)
+metrics.register_stats("cpu_admission", "Concurrency cap on CPU-heavy routes", cpu_admission.stats)
+metrics.register_stats("log_queue", "Log records waiting for the writer thread, and dropped", logging_setup.stats)
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def read_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
 # Dependency to get current user
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    database: Session = Depends(get_db)
+    database: AsyncSession = Depends(get_db)
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    cached_user = token_cache.get(token)
+    if cached_user is not None:
+        return cached_user
+    
     try:
         # Use the global constants from database module, not the db session
         payload = jwt.decode(token, db.SECRET_KEY, algorithms=[db.ALGORITHM])
@@ -44,7 +111,7 @@ async def get_current_user(
         if user_id is None:
             raise credentials_exception
     except JWTError as e:
-        logger.error(f"JWT Error: {str(e)}")
+        logger.error("JWT Error: %s", e)
         raise credentials_exception
     
     # Convert user_id to int
@@ -53,25 +120,36 @@ async def get_current_user(
     except ValueError:
         raise credentials_exception
     
-    user = db.get_user(database, user_id_int)
+    user = await db.get_user(database, user_id_int)
     if user is None:
         raise credentials_exception
-    return user
+    
+    # Read from the primary, since the snapshot is cached for the token's
+    # lifetime. Cache a detached snapshot, not the ORM object bound to this session
+    snapshot = UserResponse.model_validate(user)
+    token_cache.set_user(token, snapshot, expires_at=payload.get("exp"))
+    return snapshot
 
-@app.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register(user: UserCreate, database: Session = Depends(get_db)):
-    logger.info(f"Registering new user: {user.email}")
-    return db.create_user(database, user)
+@app.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED,
+          dependencies=[Depends(limit_by_ip("register")), Depends(cpu_admission)])
+async def register(user: UserCreate, response: Response, database: AsyncSession = Depends(get_db)):
+    logger.info("Registering new user: %s", user.email)
+    created = await db.create_user(database, user)
+    # The client logs in and reads the new profile straight away
+    db.note_write(response)
+    return created
 
-@app.post("/login", response_model=Token)
-def login(
+@app.post("/login", response_model=Token, dependencies=[Depends(limit_by_ip("login")), Depends(cpu_admission)])
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    database: Session = Depends(get_db)
+    database: AsyncSession = Depends(get_db)
 ):
-    logger.info(f"Login attempt: {form_data.username}")
-    user = db.authenticate_user(database, form_data.username, form_data.password)
+    logger.info("Login attempt: %s", form_data.username)
+    # Per account as well, so guessing one password from many addresses is slow too
+    rate_limiter.check("login", "email", form_data.username.strip().lower())
+    user = await db.authenticate_user(database, form_data.username, form_data.password)
     if not user:
-        logger.warning(f"Login failed for user: {form_data.username}")
+        logger.warning("Login failed for user: %s", form_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -79,169 +157,304 @@ def login(
         )
     
     access_token = db.create_access_token(data={"sub": str(user.user_id)})
-    logger.info(f"Login successful for user: {form_data.username}, user_id: {user.user_id}")
+    logger.info("Login successful for user: %s, user_id: %s", form_data.username, user.user_id)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/users/{user_id}", response_model=UserResponse)
-def read_user(
+async def read_user(
     user_id: int,
-    current_user: User = Depends(get_current_user),
-    database: Session = Depends(get_db)
+    current_user: UserResponse = Depends(get_current_user),
+    database: AsyncSession = Depends(get_read_db)
 ):
-    logger.info(f"Fetching user by ID: {user_id}")
-    user = db.get_user(database, user_id)
+    logger.info("Fetching user by ID: %s", user_id)
+    user = await db.get_user(database, user_id)
     if user is None:
-        logger.warning(f"User not found: {user_id}")
+        logger.warning("User not found: %s", user_id)
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 @app.get("/users/me", response_model=UserResponse)
-def read_current_user(current_user: User = Depends(get_current_user)):
+async def read_current_user(current_user: UserResponse = Depends(get_current_user)):
     """Get the currently authenticated user"""
-    logger.info(f"Fetching current user: {current_user.user_id}")
+    logger.info("Fetching current user: %s", current_user.user_id)
     return current_user
 
 @app.put("/users/{user_id}", response_model=UserResponse)
-def update_user(
+async def update_user(
     user_id: int,
     user_update: UserUpdate,
-    current_user: User = Depends(get_current_user),
-    database: Session = Depends(get_db)
+    response: Response,
+    current_user: UserResponse = Depends(get_current_user),
+    database: AsyncSession = Depends(get_db)
 ):
-    logger.info(f"Updating user: {user_id}")
+    logger.info("Updating user: %s", user_id)
     # Check if the current user is trying to update their own profile
     if current_user.user_id != user_id:
-        logger.warning(f"Unauthorized update attempt: {current_user.user_id} tried to update {user_id}")
+        logger.warning("Unauthorized update attempt: %s tried to update %s", current_user.user_id, user_id)
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to update another user's profile"
         )
     
     # Update the user profile
-    updated_user = db.update_user(database, user_id, user_update)
+    updated_user = await db.update_user(database, user_id, user_update)
     if updated_user is None:
-        logger.warning(f"User not found for update: {user_id}")
+        logger.warning("User not found for update: %s", user_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    return updated_user
+    # Cached snapshots of this user are stale now
+    token_cache.invalidate_user(user_id)
+    db.note_write(response)
+    return UserResponse.model_validate({**current_user.model_dump(), **updated_user})
 
-@app.get("/users", response_model=UserResponse)
-def read_user_by_email(
+@app.get("/users", response_model=UserResponse, dependencies=[Depends(limit_by_ip("user_lookup"))])
+async def read_user_by_email(
     email: str,
-    database: Session = Depends(get_db)
+    database: AsyncSession = Depends(get_read_db)
 ):
-    logger.info(f"Fetching user by email: {email}")
-    user = db.get_user_by_email(database, email)
+    logger.info("Fetching user by email: %s", email)
+    user = await db.get_user_by_email(database, email)
     if user is None:
-        logger.warning(f"User not found with email: {email}")
+        logger.warning("User not found with email: %s", email)
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
+@app.get("/foods/search", response_model=List[FoodResponse], dependencies=[Depends(cpu_admission)])
+async def search_foods_endpoint(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=100),
+    database: AsyncSession = Depends(get_read_db)
+):
+    # Exact and prefix matches first, then word matches, then typo corrections
+    snapshot = await food_catalog.get(database)
+    return await search_foods(snapshot, q, limit)
+
 @app.get("/foods", response_model=List[FoodResponse])
-def read_foods(
-    skip: int = 0,
-    limit: int = 100,
-    database: Session = Depends(get_db)
+async def read_foods(
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=0),
+    database: AsyncSession = Depends(get_read_db)
 ):
-    logger.info(f"Fetching foods, skip: {skip}, limit: {limit}")
-    foods = db.get_foods(database, skip=skip, limit=limit)
-    return foods
+    logger.info("Fetching foods, skip: %s, limit: %s", skip, limit)
+    
+    # Served from the in-process catalog snapshot with pre-serialized bytes
+    snapshot = await food_catalog.get(database)
+    etag = snapshot.etag(skip, limit)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=snapshot.page(skip, limit), media_type="application/json", headers=headers)
 
 @app.post("/foodlogs", response_model=FoodLogResponse, status_code=status.HTTP_201_CREATED)
-def create_food_log(
+async def create_food_log(
     food_log: FoodLogCreate,
-    current_user: User = Depends(get_current_user),
-    database: Session = Depends(get_db)
+    response: Response,
+    current_user: UserResponse = Depends(get_current_user),
+    database: AsyncSession = Depends(get_db)
 ):
-    logger.info(f"Creating food log for user: {current_user.user_id}, food: {food_log.food_id}")
-    
-    # Debug info
-    logger.info(f"Current user ID: {current_user.user_id}, Food log user ID: {food_log.user_id}")
+    logger.info("Creating food log for user: %s, food: %s", current_user.user_id, food_log.food_id)
     
     if int(food_log.user_id) != current_user.user_id:
-        logger.warning(f"Unauthorized food log creation: {current_user.user_id} tried for {food_log.user_id}")
+        logger.warning("Unauthorized food log creation: %s tried for %s", current_user.user_id, food_log.user_id)
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to create food log for another user"
         )
     
     try:
-        result = db.create_food_log(database, food_log)
-        logger.info(f"Food log created successfully: {result.foodlog_id}")
+        result = await db.create_food_log(database, food_log)
+        analytics_cache.invalidate_user(current_user.user_id)
+        db.note_write(response)
+        logger.info("Food log created successfully: %s", result['foodlog_id'])
         return result
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error creating food log: {str(e)}")
+        logger.error("Error creating food log: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating food log: {str(e)}"
         )
 
-@app.get("/users/{user_id}/foodlogs", response_model=List[FoodLogResponse])
-def read_user_foodlogs(
+@app.post("/foodlogs/batch", response_model=List[FoodLogResponse], status_code=status.HTTP_201_CREATED)
+async def create_food_logs_batch(
+    response: Response,
+    food_logs: List[FoodLogCreate] = Body(..., min_length=1, max_length=MAX_FOODLOG_BATCH),
+    current_user: UserResponse = Depends(get_current_user),
+    database: AsyncSession = Depends(get_db)
+):
+    logger.info("Creating %s food logs for user: %s", len(food_logs), current_user.user_id)
+    
+    if any(int(food_log.user_id) != current_user.user_id for food_log in food_logs):
+        logger.warning("Unauthorized batch food log creation by user: %s", current_user.user_id)
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to create food log for another user"
+        )
+    
+    created = await db.create_food_logs(database, food_logs)
+    analytics_cache.invalidate_user(current_user.user_id)
+    db.note_write(response)
+    return created
+
+@app.get("/users/{user_id}/foodlogs", response_model=List[FoodLogDetailResponse])
+async def read_user_foodlogs(
     user_id: int,
-    current_user: User = Depends(get_current_user),
-    database: Session = Depends(get_db)
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: UserResponse = Depends(get_current_user),
+    database: AsyncSession = Depends(get_read_db)
 ):
-    logger.info(f"Fetching food logs for user: {user_id}")
+    logger.info("Fetching food logs for user: %s", user_id)
     
     if user_id != current_user.user_id:
-        logger.warning(f"Unauthorized food log access: {current_user.user_id} tried to access {user_id}")
+        logger.warning("Unauthorized food log access: %s tried to access %s", current_user.user_id, user_id)
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to view another user's food logs"
         )
     
-    foodlogs = db.get_user_foodlogs(database, user_id)
-    return foodlogs
+    foodlogs, next_cursor = await db.get_user_foodlogs_page(
+        database, user_id, start=start, end=end, cursor=cursor, limit=limit
+    )
+    
+    # Pass the keyset cursor for the next page in a header so the body stays a plain list
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return rows_response(FoodLogDetailResponse, foodlogs, headers=headers)
+
+@app.get("/users/{user_id}/daily-totals", response_model=List[DailyNutritionResponse])
+async def read_user_daily_totals(
+    user_id: int,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    points: Optional[int] = Query(None, ge=3, le=MAX_SERIES_POINTS),
+    current_user: UserResponse = Depends(get_current_user),
+    database: AsyncSession = Depends(get_read_db)
+):
+    logger.info("Fetching daily totals for user: %s", user_id)
+    
+    if user_id != current_user.user_id:
+        logger.warning("Unauthorized daily totals access: %s tried to access %s", current_user.user_id, user_id)
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to view another user's daily totals"
+        )
+    
+    totals = await db.get_daily_totals(database, user_id, start=start, end=end)
+    return rows_response(DailyNutritionResponse, downsample_rows(totals, "calories", points))
+
+@app.get("/users/{user_id}/export")
+async def export_user_history(
+    user_id: int,
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    logger.info("Exporting history for user: %s as %s", user_id, format)
+    
+    if user_id != current_user.user_id:
+        logger.warning("Unauthorized export attempt: %s tried to export %s", current_user.user_id, user_id)
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to export another user's history"
+        )
+    rate_limiter.check("export", "user", user_id)
+    
+    # Rows are streamed straight from the database cursor, never collected in a list
+    return StreamingResponse(
+        stream_user_export(user_id, format, primary=db.wrote_recently(request)),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="fitness_history_{user_id}.{format}"'}
+    )
 
 @app.get("/progress/{user_id}", response_model=List[ProgressResponse])
-def read_user_progress(
+async def read_user_progress(
+    user_id: int,
+    points: Optional[int] = Query(None, ge=3, le=MAX_SERIES_POINTS),
+    current_user: UserResponse = Depends(get_current_user),
+    database: AsyncSession = Depends(get_read_db)
+):
+    logger.info("Fetching progress for user: %s", user_id)
+    
+    if user_id != current_user.user_id:
+        logger.warning("Unauthorized progress access: %s tried to access %s", current_user.user_id, user_id)
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to view another user's progress"
+        )
+    
+    progress = await db.get_user_progress(database, user_id)
+    return rows_response(ProgressResponse, downsample_rows(progress, "weight", points))
+
+@app.get("/progress/{user_id}/analytics", dependencies=[Depends(cpu_admission)])
+async def read_progress_analytics(
     user_id: int,
-    current_user: User = Depends(get_current_user),
-    database: Session = Depends(get_db)
+    window: int = Query(7, ge=1, le=365),
+    trend: str = Query("linear", pattern="^(linear|robust)$"),
+    points: Optional[int] = Query(None, ge=3, le=MAX_SERIES_POINTS),
+    current_user: UserResponse = Depends(get_current_user),
+    database: AsyncSession = Depends(get_read_db)
 ):
-    logger.info(f"Fetching progress for user: {user_id}")
+    logger.info("Fetching progress analytics for user: %s", user_id)
     
     if user_id != current_user.user_id:
-        logger.warning(f"Unauthorized progress access: {current_user.user_id} tried to access {user_id}")
+        logger.warning("Unauthorized analytics access: %s tried to access %s", current_user.user_id, user_id)
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to view another user's progress"
         )
     
-    progress = db.get_user_progress(database, user_id)
-    return progress
+    # Cached encoded until the user's next food log or progress write
+    variant = (window, trend, points)
+    body = analytics_cache.get_response(user_id, variant)
+    if body is None:
+        generation = analytics_cache.generation(user_id)
+        progress, daily = await db.get_progress_series(database, user_id)
+        result = await run_in_threadpool(progress_analytics, progress, daily, window, trend, points)
+        body = orjson.dumps(result)
+        analytics_cache.set_response(user_id, variant, body, generation)
+    return Response(content=body, media_type="application/json")
 
 @app.post("/progress", response_model=ProgressResponse, status_code=status.HTTP_201_CREATED)
-def create_progress(
+async def create_progress(
     progress: ProgressCreate,
-    current_user: User = Depends(get_current_user),
-    database: Session = Depends(get_db)
+    response: Response,
+    current_user: UserResponse = Depends(get_current_user),
+    database: AsyncSession = Depends(get_db)
 ):
-    logger.info(f"Creating progress record for user: {current_user.user_id}")
+    logger.info("Creating progress record for user: %s", current_user.user_id)
     
     if progress.user_id != current_user.user_id:
-        logger.warning(f"Unauthorized progress creation: {current_user.user_id} tried for {progress.user_id}")
+        logger.warning("Unauthorized progress creation: %s tried for %s", current_user.user_id, progress.user_id)
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to create progress for another user"
         )
     
-    return db.create_progress(database, progress)
+    created = await db.create_progress(database, progress)
+    analytics_cache.invalidate_user(current_user.user_id)
+    db.note_write(response)
+    return created
 
-@app.post("/seed-foods")
-def seed_foods_endpoint(database: Session = Depends(get_db)):
+@app.post("/seed-foods", dependencies=[Depends(limit_by_ip("seed_foods"))])
+async def seed_foods_endpoint(database: AsyncSession = Depends(get_db)):
     logger.info("Seeding foods database")
-    seed_foods(database)
+    await db.seed_default_foods(database)
+    food_catalog.invalidate()
     return {"message": "Foods seeded successfully"}
 
 if __name__ == "__main__":
     from models import SessionLocal
     from db_operations import seed_foods
-    db = SessionLocal()
-    seed_foods(db)
+    from schema import migrate
+    migrate()
+    session = SessionLocal()
+    seed_foods(session)
     print("Food table seeded with default foods.")
-    db.close() 
\ No newline at end of file
+    session.close() 
\ No newline at end of file
@@ -0,0 +1,166 @@
+import argparse
+import time
+
+from models import SessionLocal, get_engine
+from models.base import DATABASE_REPLICA_URLS, create_sync_engine
+from rollups import rebuild_daily_nutrition
+from food_import import DEFAULT_BATCH_SIZE, ensure_name_keys, import_foods, read_records
+from schema import create_database_if_not_exists, migrate
+from replica_sync import DEFAULT_BATCH_SIZE as SYNC_BATCH_SIZE, copy_database
+from partitions import (
+    ARCHIVE_CUTOFF_MAX_AGE, PARTITION_MONTHS_AHEAD,
+    archive_food_logs, ensure_future_partitions, partition_food_logs, supports_partitioning
+)
+from data_generator import DEFAULT_BATCH_SIZE as GENERATE_BATCH_SIZE, SYNTHETIC_PASSWORD, generate_dataset
+
+def migrate_schema(args):
+    migrate()
+    print("Database schema is up to date.")
+
+def rebuild_daily_totals(args):
+    db = SessionLocal()
+    try:
+        rows = rebuild_daily_nutrition(db, user_id=args.user_id)
+    finally:
+        db.close()
+    target = f"user {args.user_id}" if args.user_id is not None else "all users"
+    print(f"Rebuilt {rows} daily nutrition rows for {target}.")
+
+def import_foods_file(args):
+    db = SessionLocal()
+    try:
+        ensure_name_keys(db.connection())
+        db.commit()
+        stats = import_foods(
+            db,
+            read_records(args.path, args.format),
+            batch_size=args.batch_size,
+            on_batch=lambda stats: print(f"  {stats}")
+        )
+    finally:
+        db.close()
+    print(f"Imported {args.path}: {stats}")
+
+def generate_data(args):
+    migrate()
+    stats = generate_dataset(
+        users=args.users,
+        days=args.days,
+        entries_per_day=args.entries_per_day,
+        foods=args.foods,
+        workers=args.workers,
+        seed=args.seed,
+        progress_every=args.progress_every,
+        batch_size=args.batch_size,
+        on_chunk=lambda stats: print(f"  {stats}")
+    )
+    print(f"Generated {stats}. Accounts log in with password {SYNTHETIC_PASSWORD!r}.")
+
+def partition_foodlogs(args):
+    migrate()
+    with get_engine().begin() as conn:
+        if not supports_partitioning(conn):
+            print(f"Partitioning needs MySQL; {conn.dialect.name} food_logs left as is.")
+            return
+        if partition_food_logs(conn, args.months_ahead):
+            print("Partitioned food_logs by month.")
+        added = ensure_future_partitions(conn, args.months_ahead)
+    print(f"Added {len(added)} future partitions." if added else "Future partitions are already in place.")
+
+def archive_foodlogs(args):
+    migrate()
+    rows = archive_food_logs(get_engine(), args.older_than, grace_seconds=args.grace)
+    print(f"Archived {rows} food logs older than {args.older_than} months.")
+
+def sync_replica(args):
+    urls = args.replica_url or DATABASE_REPLICA_URLS
+    if not urls:
+        print("No replica given; pass --replica-url or set DATABASE_REPLICA_URLS.")
+        return
+    migrate()
+    for url in urls:
+        create_database_if_not_exists(url)
+    targets = [create_sync_engine(url) for url in urls]
+    try:
+        while True:
+            for target in targets:
+                copied = copy_database(get_engine(), target, batch_size=args.batch_size)
+                print(f"Copied {sum(copied.values())} rows to {target.url.render_as_string(hide_password=True)}.")
+            if not args.interval:
+                break
+            time.sleep(args.interval)
+    finally:
+        for target in targets:
+            target.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description="Fitness Tracker maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser(
+        "migrate",
+        help="Create the database and any missing tables, and upgrade older ones"
+    )
+    migrate_parser.set_defaults(func=migrate_schema)
+
+    rebuild = subparsers.add_parser(
+        "rebuild-daily-totals",
+        help="Recompute the daily_nutrition rollup, and progress calorie intake, from food_logs"
+    )
+    rebuild.add_argument("--user-id", type=int, default=None, help="Only rebuild this user's rows")
+    rebuild.set_defaults(func=rebuild_daily_totals)
+
+    import_parser = subparsers.add_parser(
+        "import-foods",
+        help="Stream a CSV or NDJSON nutrition dump into the foods table"
+    )
+    import_parser.add_argument("path", help="File to import, optionally gzipped")
+    import_parser.add_argument("--format", choices=("csv", "ndjson"), default=None, help="Defaults to the file extension")
+    import_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Foods per upsert and commit")
+    import_parser.set_defaults(func=import_foods_file)
+
+    generate_parser = subparsers.add_parser(
+        "generate-data",
+        help="Fill the database with synthetic users, foods, food logs and progress for scale testing"
+    )
+    generate_parser.add_argument("--users", type=int, default=1000, help="Users to add")
+    generate_parser.add_argument("--days", type=int, default=365, help="Days of history, ending today")
+    generate_parser.add_argument("--entries-per-day", type=float, default=3.0, help="Food logs on a day a typical user logs; power users log more")
+    generate_parser.add_argument("--foods", type=int, default=2000, help="Synthetic foods to upsert into the catalog first, 0 to use the existing foods")
+    generate_parser.add_argument("--progress-every", type=int, default=7, help="Days between progress entries")
+    generate_parser.add_argument("--workers", type=int, default=1, help="Processes inserting in parallel")
+    generate_parser.add_argument("--batch-size", type=int, default=GENERATE_BATCH_SIZE, help="Rows per bulk insert")
+    generate_parser.add_argument("--seed", type=int, default=0)
+    generate_parser.set_defaults(func=generate_data)
+
+    partition_parser = subparsers.add_parser(
+        "partition-foodlogs",
+        help="Partition food_logs by month on MySQL and pre-create upcoming partitions; run it monthly"
+    )
+    partition_parser.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD, help="Months of empty partitions to keep ready")
+    partition_parser.set_defaults(func=partition_foodlogs)
+
+    archive_parser = subparsers.add_parser(
+        "archive-foodlogs",
+        help="Move food logs older than N months into the compressed food_logs_archive table"
+    )
+    archive_parser.add_argument("--older-than", type=int, required=True, help="Keep this many whole months before the current one in food_logs")
+    archive_parser.add_argument("--grace", type=float, default=ARCHIVE_CUTOFF_MAX_AGE,
+                                help="Seconds between publishing the new cutoff and deleting archived rows")
+    archive_parser.set_defaults(func=archive_foodlogs)
+
+    sync_parser = subparsers.add_parser(
+        "sync-replica",
+        help="Copy the whole database into stand-in read replicas, for trying out DATABASE_REPLICA_URLS locally"
+    )
+    sync_parser.add_argument("--replica-url", action="append", default=None,
+                             help="Replica database URL, repeatable; defaults to DATABASE_REPLICA_URLS")
+    sync_parser.add_argument("--interval", type=float, default=0, help="Seconds between copies; 0 copies once and exits")
+    sync_parser.add_argument("--batch-size", type=int, default=SYNC_BATCH_SIZE, help="Rows per insert")
+    sync_parser.set_defaults(func=sync_replica)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
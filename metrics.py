@@ -0,0 +1,262 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import os
+import time
+
+# Set METRICS_ENABLED=0 to drop the middleware and the cursor hooks entirely
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+# Starlette appends the charset itself
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"] + self.samples()
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, labels: Tuple = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set(self, labels: Tuple, value: float) -> None:
+        # For values read at scrape time, e.g. totals another object keeps
+        self._values[labels] = value
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"
+                for labels, value in self._values.items()]
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, labels: Tuple = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+class Histogram(Metric):
+    """
+    Cumulative buckets are only built when rendering; observing a value
+    bumps a single slot, so the per-request cost is one bisect.
+    """
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # labels -> [counts per bucket with +Inf last, sum]
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, labels: Tuple, value: float) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                bucket_labels = _labels(self.label_names, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        # Called at scrape time to refresh gauges read from other objects
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        for collect in self.collectors:
+            collect()
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route template, method and status", ("route", "method", "status")))
+http_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "Time to produce the whole response, by route", ("route", "method")))
+http_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "Requests currently being served"))
+db_queries = registry.register(Histogram(
+    "http_request_db_queries", "Database statements executed per request", ("route", "method"), QUERY_COUNT_BUCKETS))
+db_query_time = registry.register(Histogram(
+    "http_request_db_seconds", "Time spent in database statements per request", ("route", "method")))
+db_pool = registry.register(Gauge(
+    "db_pool_connections", "Connections in the SQLAlchemy pool by state", ("engine", "state")))
+db_pool_waits = registry.register(Counter(
+    "db_pool_waits_total", "Checkouts that found the pool exhausted and had to wait", ("engine",)))
+db_pool_wait_time = registry.register(Counter(
+    "db_pool_wait_seconds_total", "Time spent waiting for a pooled connection", ("engine",)))
+
+# [statements, seconds] for the request being served, None outside requests
+_request_db: ContextVar[Optional[list]] = ContextVar("request_db", default=None)
+
+# Called with (statement, parameters, executemany, seconds) after every
+# statement; one pair of cursor hooks times statements for all of them
+_statement_listeners: List[Callable[[str, Any, bool, float], None]] = []
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._statement_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        seconds = time.perf_counter() - context._statement_started
+        for listener in _statement_listeners:
+            listener(statement, parameters, executemany, seconds)
+
+def on_statement(listener: Callable[[str, Any, bool, float], None]) -> None:
+    """Call listener after every statement with how long it took."""
+    if not _statement_listeners:
+        # Listening on the Engine class covers engines created later, lazily
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    _statement_listeners.append(listener)
+
+def _count_request_statement(statement, parameters, executemany, seconds):
+    totals = _request_db.get()
+    if totals is not None:
+        totals[0] += 1
+        totals[1] += seconds
+
+if METRICS_ENABLED:
+    on_statement(_count_request_statement)
+
+def instrument_pool(engine: Engine, name: str) -> None:
+    """
+    Report pool occupancy, tracked through the public pool events, and
+    checkouts that had to wait for a free connection when the pool counts
+    them (models.base.TimedPoolMixin).
+    """
+    if not isinstance(engine.pool, QueuePool):
+        return
+    # [open, checked out]
+    counts = [0, 0]
+
+    def opened(dbapi_connection, connection_record):
+        counts[0] += 1
+
+    def closed(*args):
+        counts[0] -= 1
+
+    def checked_out(dbapi_connection, connection_record, connection_proxy):
+        counts[1] += 1
+
+    def checked_in(dbapi_connection, connection_record):
+        counts[1] -= 1
+
+    event.listen(engine, "connect", opened)
+    event.listen(engine, "close", closed)
+    event.listen(engine, "close_detached", closed)
+    event.listen(engine, "checkout", checked_out)
+    event.listen(engine, "checkin", checked_in)
+
+    def collect():
+        open_connections, in_use = max(counts[0], 0), max(counts[1], 0)
+        # dispose() swaps in a new pool; listeners carry over to it
+        size = engine.pool.size()
+        db_pool.set((name, "size"), size)
+        db_pool.set((name, "checked_out"), in_use)
+        db_pool.set((name, "idle"), max(open_connections - in_use, 0))
+        db_pool.set((name, "overflow"), max(open_connections - size, 0))
+        if hasattr(engine.pool, "waits"):
+            db_pool_waits.set((name,), engine.pool.waits)
+            db_pool_wait_time.set((name,), engine.pool.wait_seconds)
+    registry.collectors.append(collect)
+
+def register_stats(name: str, help: str, stats: Callable[[], Dict[str, float]]) -> None:
+    # Expose an object's stats() dict as one gauge with a stat label
+    gauge = registry.register(Gauge(name, help, ("stat",)))
+
+    def collect():
+        for key, value in stats().items():
+            gauge.set((key,), value)
+    registry.collectors.append(collect)
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware timing each HTTP request and counting the database
+    statements it runs. Requests are labelled with the matched route template
+    (/users/{user_id}), never the raw path, so series stay bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        totals = [0, 0.0]
+        token = _request_db.set(totals)
+        http_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_in_flight.dec()
+            _request_db.reset(token)
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            labels = (route.path if route is not None else "<unmatched>", scope["method"])
+            http_requests.inc(labels + (status[0],))
+            http_latency.observe(labels, elapsed)
+            db_queries.observe(labels, totals[0])
+            db_query_time.observe(labels, totals[1])
@@ -1,13 +1,31 @@
-from .base import Base, engine, SessionLocal, get_db
-from .models import User, Food, FoodLog, Progress
+from .base import (
+    Base, SessionLocal, get_db,
+    get_engine, get_async_engine, get_read_engine, get_replica_engines, dispose_engines,
+    LazySessionmaker
+)
+from .models import User, Food, FoodLog, Progress, DailyNutrition, FoodLogArchive, ArchiveCutoff
 
 __all__ = [
     'Base',
-    'engine',
     'SessionLocal',
     'get_db',
+    'get_engine',
+    'get_async_engine',
+    'get_read_engine',
+    'get_replica_engines',
+    'dispose_engines',
+    'LazySessionmaker',
     'User',
     'Food',
     'FoodLog',
-    'Progress'
-] 
\ No newline at end of file
+    'Progress',
+    'DailyNutrition',
+    'FoodLogArchive',
+    'ArchiveCutoff'
+]
+
+def __getattr__(name):
+    # The engine is created lazily, see models.base
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
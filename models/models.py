@@ -1,5 +1,5 @@
 from datetime import datetime, date
-from sqlalchemy import Column, Integer, String, Float, DateTime, Date, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, Date, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from .base import Base
 
@@ -24,6 +24,8 @@ class Food(Base):
 
     food_id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False)
+    # Normalized name, the dedupe key for seeding and bulk imports
+    name_key = Column(String(100), nullable=True)
     calories = Column(Integer, nullable=False)
     protein = Column(Float, nullable=False)
     fat = Column(Float, nullable=False)
@@ -32,6 +34,10 @@ class Food(Base):
     # Relationships
     food_logs = relationship("FoodLog", back_populates="food")
 
+    __table_args__ = (
+        Index("ux_foods_name_key", "name_key", unique=True),
+    )
+
 class FoodLog(Base):
     __tablename__ = "food_logs"
 
@@ -49,6 +55,13 @@ class FoodLog(Base):
     user = relationship("User", back_populates="food_logs")
     food = relationship("Food", back_populates="food_logs")
 
+    # Per-user date range reads and keyset pagination walk this index in
+    # (date, foodlog_id) order without touching the rest of the table.
+    # On MySQL, `manage.py partition-foodlogs` splits the table by month.
+    __table_args__ = (
+        Index("ix_food_logs_user_date", "user_id", "date", "foodlog_id"),
+    )
+
 class Progress(Base):
     __tablename__ = "progress"
 
@@ -57,7 +70,52 @@ class Progress(Base):
     date = Column(Date, nullable=False, default=date.today)
     weight = Column(Float, nullable=False)
     bmi = Column(Float, nullable=False)
+    # Calories logged that day, kept in step with daily_nutrition
     calorie_intake = Column(Integer, nullable=False)
 
     # Relationships
-    user = relationship("User", back_populates="progress_records") 
\ No newline at end of file
+    user = relationship("User", back_populates="progress_records")
+
+    __table_args__ = (
+        Index("ix_progress_user_date", "user_id", "date", "progress_id"),
+    )
+
+class DailyNutrition(Base):
+    __tablename__ = "daily_nutrition"
+
+    # One row per user per day, maintained alongside food_logs writes
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    calories = Column(Integer, nullable=False, default=0)
+    protein = Column(Float, nullable=False, default=0)
+    fat = Column(Float, nullable=False, default=0)
+    carbohydrates = Column(Float, nullable=False, default=0)
+    entry_count = Column(Integer, nullable=False, default=0)
+
+class FoodLogArchive(Base):
+    __tablename__ = "food_logs_archive"
+
+    # Food logs older than the archive cutoff, moved out of food_logs by
+    # `manage.py archive-foodlogs`. Ids are kept from food_logs.
+    foodlog_id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
+    food_id = Column(Integer, ForeignKey("foods.food_id", ondelete="SET NULL"), nullable=True)
+    date = Column(Date, nullable=False)
+    quantity = Column(Float, nullable=False)
+    calories = Column(Integer, nullable=False)
+    protein = Column(Float, nullable=False)
+    fat = Column(Float, nullable=False)
+    carbohydrates = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index("ix_food_logs_archive_user_date", "user_id", "date", "foodlog_id"),
+        # Rarely read, so trade CPU for half the disk and buffer pool pages
+        {"mysql_row_format": "COMPRESSED", "mysql_key_block_size": "8"},
+    )
+
+class ArchiveCutoff(Base):
+    __tablename__ = "archive_cutoffs"
+
+    # Rows of table_name dated before archived_before live in its archive
+    table_name = Column(String(64), primary_key=True)
+    archived_before = Column(Date, nullable=False)
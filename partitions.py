@@ -0,0 +1,257 @@
+from datetime import date
+from sqlalchemy import Table, delete, insert, or_, select, text, union
+from sqlalchemy.engine import Connection, Engine
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+import os
+import time
+
+from cache import TTLCache
+from db_utils import upsert_stmt
+from models import ArchiveCutoff, Food, FoodLog, FoodLogArchive
+
+logger = logging.getLogger(__name__)
+
+# Empty monthly partitions kept ready ahead of the current month
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+# How long a process trusts its copy of the archive cutoff. Archiving waits
+# this long between publishing a new cutoff and deleting the archived rows.
+ARCHIVE_CUTOFF_MAX_AGE = float(os.getenv("ARCHIVE_CUTOFF_MAX_AGE", "60"))
+
+FOOD_LOGS = FoodLog.__table__
+ARCHIVE = FoodLogArchive.__table__
+# Catch-all for dates past the last monthly partition
+OVERFLOW_PARTITION = "pmax"
+
+cutoff_cache = TTLCache(maxsize=1, ttl=ARCHIVE_CUTOFF_MAX_AGE)
+
+def month_start(day: date, offset: int = 0) -> date:
+    months = day.year * 12 + day.month - 1 + offset
+    return date(months // 12, months % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"p{month:%Y%m}"
+
+def _partition_clause(month: date) -> str:
+    # Each partition holds one month: everything before the next month's first day
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN ('{month_start(month, 1).isoformat()}')"
+
+def archive_cutoff_select():
+    return select(ArchiveCutoff.archived_before).where(ArchiveCutoff.table_name == FOOD_LOGS.name)
+
+def needs_archive(archived_before: Optional[date], start: Optional[date]) -> bool:
+    return archived_before is not None and (start is None or start < archived_before)
+
+def with_archive(build: Callable[[Table], object], archived_before: Optional[date], start: Optional[date] = None):
+    """
+    build(table) selects food log rows from one table. Returns that select on
+    food_logs, unioned with the same select on the archive when a range
+    starting at start reaches below the cutoff. The rows must include
+    foodlog_id: for a while after each archive run the same rows sit in both
+    tables, and UNION drops the copies.
+    """
+    query = build(FOOD_LOGS)
+    if needs_archive(archived_before, start):
+        query = union(query, build(ARCHIVE).where(ARCHIVE.c.date < archived_before))
+    return query
+
+def user_foodlogs_select(
+    user_id: int,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    after: Optional[Tuple[date, int]] = None,
+    archived_before: Optional[date] = None
+):
+    """
+    A user's food logs with food names, ordered by (date, foodlog_id).
+    Bounds are inclusive; after is the (date, foodlog_id) a page resumes from.
+    """
+    def from_table(table):
+        # Only the columns the response needs, as plain row tuples; join with
+        # Food table to get food names
+        query = select(
+            table.c.foodlog_id,
+            table.c.user_id,
+            table.c.food_id,
+            Food.name.label("food_name"),
+            table.c.date,
+            table.c.quantity,
+            table.c.calories,
+            table.c.protein,
+            table.c.fat,
+            table.c.carbohydrates
+        ).join(
+            Food, table.c.food_id == Food.food_id
+        ).where(
+            table.c.user_id == user_id
+        )
+
+        # Date bounds are inclusive and map onto the (user_id, date) index range
+        if start is not None:
+            query = query.where(table.c.date >= start)
+        if end is not None:
+            query = query.where(table.c.date <= end)
+
+        # Seek past the last row of the previous page instead of using OFFSET
+        if after is not None:
+            after_date, after_id = after
+            query = query.where(
+                table.c.date >= after_date,
+                or_(table.c.date > after_date, table.c.foodlog_id > after_id)
+            )
+        return query
+
+    # The archive is only read when the range starts before its cutoff
+    query = with_archive(from_table, archived_before, after[0] if after is not None else start)
+    return query.order_by("date", "foodlog_id")
+
+def supports_partitioning(conn: Connection) -> bool:
+    return conn.dialect.name == "mysql"
+
+def food_log_partitions(conn: Connection) -> Dict[str, str]:
+    # Partition name -> upper bound, in order; empty when not partitioned
+    rows = conn.execute(text(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION"
+    ), {"table": FOOD_LOGS.name})
+    return {name: bound.strip("'") for name, bound in rows}
+
+def partition_food_logs(conn: Connection, months_ahead: int = PARTITION_MONTHS_AHEAD) -> bool:
+    """
+    Rebuild food_logs as monthly RANGE COLUMNS partitions on date, MySQL
+    only. Rewrites the whole table, so run it in a maintenance window; does
+    nothing if the table is already partitioned. MySQL requires the date in
+    the primary key and does not allow foreign keys on partitioned tables,
+    so both foreign keys are dropped.
+    """
+    if food_log_partitions(conn):
+        return False
+
+    foreign_keys = conn.execute(text(
+        "SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS "
+        "WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+    ), {"table": FOOD_LOGS.name}).scalars().all()
+    if foreign_keys:
+        logger.info("Dropping foreign keys %s from food_logs", foreign_keys)
+        conn.execute(text("ALTER TABLE food_logs " + ", ".join(f"DROP FOREIGN KEY `{name}`" for name in foreign_keys)))
+    conn.execute(text("ALTER TABLE food_logs DROP PRIMARY KEY, ADD PRIMARY KEY (foodlog_id, date)"))
+
+    today = date.today()
+    oldest = conn.execute(select(FOOD_LOGS.c.date).order_by(FOOD_LOGS.c.date).limit(1)).scalar() or today
+    month, last = month_start(oldest), month_start(today, months_ahead)
+    clauses = []
+    while month <= last:
+        clauses.append(_partition_clause(month))
+        month = month_start(month, 1)
+    clauses.append(f"PARTITION {OVERFLOW_PARTITION} VALUES LESS THAN (MAXVALUE)")
+    logger.info("Partitioning food_logs into %s partitions", len(clauses))
+    conn.execute(text(f"ALTER TABLE food_logs PARTITION BY RANGE COLUMNS(date) ({', '.join(clauses)})"))
+    return True
+
+def ensure_future_partitions(conn: Connection, months_ahead: int = PARTITION_MONTHS_AHEAD) -> List[str]:
+    """
+    Split monthly partitions off the overflow partition up to months_ahead
+    months from now, so new rows never land in the catch-all. Cheap while
+    the overflow partition is empty; returns the partitions added.
+    """
+    partitions = food_log_partitions(conn)
+    bounds = [date.fromisoformat(bound) for name, bound in partitions.items() if name != OVERFLOW_PARTITION]
+    if not bounds:
+        return []
+    month, last = max(bounds), month_start(date.today(), months_ahead)
+    clauses, added = [], []
+    while month <= last:
+        clauses.append(_partition_clause(month))
+        added.append(partition_name(month))
+        month = month_start(month, 1)
+    if clauses:
+        clauses.append(f"PARTITION {OVERFLOW_PARTITION} VALUES LESS THAN (MAXVALUE)")
+        conn.execute(text(f"ALTER TABLE food_logs REORGANIZE PARTITION {OVERFLOW_PARTITION} INTO ({', '.join(clauses)})"))
+        logger.info("Added food_logs partitions %s", added)
+    return added
+
+def _copy_to_archive(conn: Connection, start: Optional[date], end: date) -> int:
+    # Rows already in the archive are skipped, so copies can be repeated
+    columns = [column.name for column in ARCHIVE.columns]
+    query = select(*(FOOD_LOGS.c[name] for name in columns)).where(FOOD_LOGS.c.date < end)
+    if start is not None:
+        query = query.where(FOOD_LOGS.c.date >= start)
+    copy = insert(ARCHIVE).prefix_with("IGNORE", dialect="mysql").prefix_with("OR IGNORE", dialect="sqlite")
+    return conn.execute(copy.from_select(columns, query)).rowcount
+
+def _oldest_before(conn: Connection, cutoff: date) -> Optional[date]:
+    return conn.execute(
+        select(FOOD_LOGS.c.date).where(FOOD_LOGS.c.date < cutoff).order_by(FOOD_LOGS.c.date).limit(1)
+    ).scalar()
+
+def archive_food_logs(engine: Engine, older_than_months: int, grace_seconds: float = ARCHIVE_CUTOFF_MAX_AGE) -> int:
+    """
+    Move food logs dated before the first day of the month older_than_months
+    months ago into food_logs_archive, a month per transaction, and return
+    how many rows were copied. Rows are copied, the new cutoff is published,
+    and only after grace_seconds, once every process has seen the cutoff,
+    are they removed from food_logs: whole partitions are dropped where the
+    table is partitioned, the rest is deleted. Back-dated logs written in
+    the meantime are copied again right before the rows are removed.
+    """
+    cutoff = month_start(date.today(), -older_than_months)
+
+    with engine.connect() as conn:
+        oldest = _oldest_before(conn, cutoff)
+        current = conn.execute(archive_cutoff_select()).scalar()
+    if oldest is None and (current is not None and current >= cutoff):
+        return 0
+
+    copied = 0
+    month = month_start(oldest) if oldest is not None else cutoff
+    while month < cutoff:
+        upper = min(month_start(month, 1), cutoff)
+        with engine.begin() as conn:
+            copied += _copy_to_archive(conn, month, upper)
+        logger.info("Archived food logs before %s: %s rows so far", upper, copied)
+        month = upper
+
+    # The cutoff never moves back, or reads would miss rows already deleted
+    if current is None or cutoff > current:
+        with engine.begin() as conn:
+            conn.execute(upsert_stmt(conn.dialect.name, ArchiveCutoff.__table__, ["table_name"], ["archived_before"]),
+                         [{"table_name": FOOD_LOGS.name, "archived_before": cutoff}])
+        if grace_seconds > 0:
+            logger.info("Waiting %ss for readers to pick up cutoff %s", grace_seconds, cutoff)
+            time.sleep(grace_seconds)
+
+    with engine.connect() as conn:
+        if supports_partitioning(conn):
+            bounds = {
+                name: date.fromisoformat(bound) for name, bound in food_log_partitions(conn).items()
+                if name != OVERFLOW_PARTITION and date.fromisoformat(bound) <= cutoff
+            }
+            # RANGE partitions have no lower bound, so back-dated rows logged
+            # later land in the oldest remaining partition. DDL commits on its
+            # own, so writers are locked out between the last copy and the drop.
+            if bounds:
+                conn.execute(text("LOCK TABLES food_logs WRITE, food_logs_archive WRITE"))
+                try:
+                    copied += _copy_to_archive(conn, None, max(bounds.values()))
+                    conn.execute(text(f"ALTER TABLE food_logs DROP PARTITION {', '.join(bounds)}"))
+                finally:
+                    conn.execute(text("UNLOCK TABLES"))
+                logger.info("Dropped food_logs partitions %s", list(bounds))
+
+    # Whatever the dropped partitions did not cover, a month per transaction,
+    # from the oldest row now, as logs may have been back-dated since. Only
+    # rows the archive holds are deleted, whatever the isolation level.
+    with engine.connect() as conn:
+        oldest = _oldest_before(conn, cutoff)
+    month = month_start(oldest) if oldest is not None else cutoff
+    while month < cutoff:
+        upper = min(month_start(month, 1), cutoff)
+        with engine.begin() as conn:
+            copied += _copy_to_archive(conn, month, upper)
+            archived_ids = select(ARCHIVE.c.foodlog_id).where(ARCHIVE.c.date >= month, ARCHIVE.c.date < upper)
+            conn.execute(delete(FOOD_LOGS).where(
+                FOOD_LOGS.c.date >= month, FOOD_LOGS.c.date < upper, FOOD_LOGS.c.foodlog_id.in_(archived_ids)
+            ))
+        month = upper
+    return copied
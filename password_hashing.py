@@ -0,0 +1,118 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from passlib.context import CryptContext
+from fastapi import HTTPException, status
+from typing import Optional
+import asyncio
+import logging
+import multiprocessing
+import os
+
+logger = logging.getLogger(__name__)
+
+# Password hashing
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Worker processes dedicated to bcrypt and how many requests may wait for one.
+# One core is left to the API process by default.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(max((os.cpu_count() or 2) - 1, 1))))
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "64"))
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+def get_password_hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+class PasswordHasher:
+    """
+    Runs bcrypt in its own process pool so a burst of logins cannot tie up
+    the event loop or the threadpool that serves the other endpoints.
+    Requests beyond workers + queue_size are rejected with 503.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, queue_size: int = PASSWORD_HASH_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Jobs submitted and not yet finished, running or waiting
+        self.pending = 0
+        self.max_pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created on first use; spawned workers only import this module
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def _run(self, func, *args):
+        if self.pending >= self.workers + self.queue_size:
+            self.rejected += 1
+            logger.warning("Password hashing queue full (%s pending), shedding request", self.pending)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER)}
+            )
+
+        self.pending += 1
+        self.max_pending = max(self.max_pending, self.pending)
+        loop = asyncio.get_running_loop()
+        try:
+            job = self._get_executor().submit(func, *args)
+        except BaseException:
+            # A broken or shut down pool
+            self.pending -= 1
+            self.failed += 1
+            raise
+        # A cancelled request (a client that hung up) leaves its job running
+        # in the pool, so the job is only counted out once it has finished
+        job.add_done_callback(lambda job: self._call_soon(loop, self._finished, job))
+        return await asyncio.wrap_future(job)
+
+    @staticmethod
+    def _call_soon(loop: asyncio.AbstractEventLoop, callback, *args) -> None:
+        # Done callbacks run on the pool's own thread; hand them to the loop
+        try:
+            loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # The loop already closed during shutdown
+            pass
+
+    def _finished(self, job: Future) -> None:
+        self.pending -= 1
+        if job.cancelled() or job.exception() is not None:
+            self.failed += 1
+        else:
+            self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "in_flight": min(self.pending, self.workers),
+            "queue_depth": max(self.pending - self.workers, 0),
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+password_hasher = PasswordHasher()
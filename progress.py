@@ -1,4 +1,4 @@
-import requests
+from api_client import http
 import datetime
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QTabWidget, QTableWidget, 
@@ -14,6 +14,9 @@ from matplotlib.figure import Figure
 
 API_URL = "http://127.0.0.1:8000"
 
+# Series longer than this are drawn as lines without point markers
+MAX_MARKED_POINTS = 60
+
 class MplCanvas(FigureCanvas):
     def __init__(self, width=5, height=4, dpi=100):
         self.fig = Figure(figsize=(width, height), dpi=dpi)
@@ -27,6 +30,8 @@ class ProgressWidget(QWidget):
         self.user = user
         self.back_callback = back_callback
         self.token = self.user.get("token", "")
+        # Server-side chart series, see load_analytics
+        self.analytics = None
         
         # Create main layout
         layout = QVBoxLayout()
@@ -142,7 +147,7 @@ class ProgressWidget(QWidget):
         date_label = QLabel("Select date:")
         self.date_filter = QDateEdit()
         self.date_filter.setDate(QDate.currentDate())
-        self.date_filter.dateChanged.connect(self.filter_food_logs)
+        self.date_filter.dateChanged.connect(self.load_food_logs)
         date_layout.addWidget(date_label)
         date_layout.addWidget(self.date_filter)
         date_layout.addStretch()
@@ -185,6 +190,7 @@ class ProgressWidget(QWidget):
             "Weight Over Time", 
             "BMI Over Time", 
             "Calorie Intake Over Time",
+            "Weekly Averages",
             "Macronutrient Distribution"
         ])
         self.chart_selector.currentIndexChanged.connect(self.update_chart)
@@ -210,12 +216,13 @@ class ProgressWidget(QWidget):
                 QMessageBox.warning(self, "Authentication Error", "Authentication token is missing. Please log out and log in again.")
                 return
                 
-            r = requests.get(f"{API_URL}/progress/{self.user.get('user_id')}", headers=headers)
+            r = http.get(f"{API_URL}/progress/{self.user.get('user_id')}", headers=headers)
             if r.status_code == 200:
                 self.progress_data = r.json()
                 # If no progress data exists, create initial sample data
                 if not self.progress_data:
                     self.create_sample_progress_data()
+                self.load_analytics()
                 self.update_progress_table()
                 self.update_chart()
             elif r.status_code == 401:
@@ -227,6 +234,21 @@ class ProgressWidget(QWidget):
             # Create sample data for demonstration
             self.create_sample_progress_data()
     
+    def load_analytics(self):
+        # Averages and trends come precomputed from the API; the charts fall
+        # back to the raw progress rows when this fails. Daily series are
+        # downsampled server side to one point per pixel of chart width, so
+        # drawing costs the same however long the history is.
+        try:
+            headers = {"Authorization": f"Bearer {self.token}"}
+            params = {"points": max(self.canvas.width(), 3)}
+            r = http.get(f"{API_URL}/progress/{self.user.get('user_id')}/analytics",
+                             headers=headers, params=params)
+            self.analytics = r.json() if r.status_code == 200 else None
+        except Exception as e:
+            print(f"Error loading progress analytics: {str(e)}")
+            self.analytics = None
+    
     def create_sample_progress_data(self):
         # Create sample progress data for the last 7 days
         current_date = datetime.datetime.now()
@@ -237,24 +259,19 @@ class ProgressWidget(QWidget):
         self.progress_data = []
         for i in range(7, 0, -1):
             date_str = (current_date - datetime.timedelta(days=i)).strftime("%Y-%m-%d")
-            # Add some random variation to weight and calorie intake
+            # Add some random variation to weight
             variation = (7 - i) * 0.1
             sample_weight = round(weight - variation, 1)
             sample_bmi = round(sample_weight / ((height / 100) ** 2), 2)
-            sample_calories = 2000 - (i * 20)
             
-            # Add to progress data
+            # Save to API; calorie intake comes back from the day's food logs
             entry = {
                 "date": date_str,
                 "weight": sample_weight,
                 "bmi": sample_bmi,
-                "calorie_intake": sample_calories,
                 "user_id": self.user.get('user_id')
             }
-            self.progress_data.append(entry)
-            
-            # Save to API
-            self.save_progress_entry(entry)
+            self.progress_data.append(self.save_progress_entry(entry))
         
         # Update with the actual latest values
         today_str = current_date.strftime("%Y-%m-%d")
@@ -262,20 +279,21 @@ class ProgressWidget(QWidget):
             "date": today_str,
             "weight": weight,
             "bmi": bmi,
-            "calorie_intake": 2000,
             "user_id": self.user.get('user_id')
         }
-        self.progress_data.append(today_entry)
-        self.save_progress_entry(today_entry)
+        self.progress_data.append(self.save_progress_entry(today_entry))
     
     def save_progress_entry(self, entry):
+        # Returns the entry as stored, or as sent with no intake if saving failed
         try:
             headers = {"Authorization": f"Bearer {self.token}"}
-            r = requests.post(f"{API_URL}/progress", json=entry, headers=headers)
-            if r.status_code != 201:
-                print(f"Error saving progress entry: {r.json().get('detail', 'Unknown error')}")
+            r = http.post(f"{API_URL}/progress", json=entry, headers=headers)
+            if r.status_code == 201:
+                return r.json()
+            print(f"Error saving progress entry: {r.json().get('detail', 'Unknown error')}")
         except Exception as e:
             print(f"Error saving progress entry: {str(e)}")
+        return {**entry, "calorie_intake": 0}
     
     def show_add_progress_dialog(self):
         dialog = QDialog(self)
@@ -296,14 +314,9 @@ class ProgressWidget(QWidget):
         weight_edit.setText(str(self.user.get('weight', '')))
         weight_edit.setStyleSheet("background-color: #424669; color: white; padding: 5px;")
         
-        # BMI is calculated automatically
+        # BMI is calculated automatically, calories come from the food log
         bmi_label = QLabel("BMI will be calculated automatically")
-        
-        # Calorie intake field
-        calorie_edit = QLineEdit()
-        calorie_edit.setPlaceholderText("Enter daily calorie intake")
-        calorie_edit.setText("2000")
-        calorie_edit.setStyleSheet("background-color: #424669; color: white; padding: 5px;")
+        calorie_label = QLabel("Calories are taken from your food log")
         
         # Add button
         add_btn = QPushButton("Add Entry")
@@ -324,13 +337,12 @@ class ProgressWidget(QWidget):
         layout.addRow("Date:", date_edit)
         layout.addRow("Weight (kg):", weight_edit)
         layout.addRow("", bmi_label)
-        layout.addRow("Calories:", calorie_edit)
+        layout.addRow("", calorie_label)
         layout.addRow("", add_btn)
         
         def add_entry():
             try:
                 weight = float(weight_edit.text())
-                calories = int(calorie_edit.text())
                 date_str = date_edit.date().toString("yyyy-MM-dd")
                 
                 # Calculate BMI
@@ -341,17 +353,17 @@ class ProgressWidget(QWidget):
                     "date": date_str,
                     "weight": weight,
                     "bmi": bmi,
-                    "calorie_intake": calories,
                     "user_id": self.user.get('user_id')
                 }
                 
                 # Save to API
                 headers = {"Authorization": f"Bearer {self.token}"}
-                r = requests.post(f"{API_URL}/progress", json=new_entry, headers=headers)
+                r = http.post(f"{API_URL}/progress", json=new_entry, headers=headers)
                 
                 if r.status_code == 201:
                     # Add to local data and update table
                     self.progress_data.append(r.json())
+                    self.load_analytics()
                     self.update_progress_table()
                     self.update_chart()
                     dialog.accept()
@@ -359,7 +371,7 @@ class ProgressWidget(QWidget):
                 else:
                     QMessageBox.warning(self, "Error", r.json().get("detail", "Failed to add progress entry"))
             except ValueError:
-                QMessageBox.warning(self, "Error", "Please enter valid numbers for weight and calories")
+                QMessageBox.warning(self, "Error", "Please enter a valid number for weight")
             except Exception as e:
                 QMessageBox.critical(self, "Error", str(e))
         
@@ -376,10 +388,13 @@ class ProgressWidget(QWidget):
                 QMessageBox.warning(self, "Authentication Error", "Authentication token is missing. Please log out and log in again.")
                 return
                 
-            # For simplicity, we assume there's an endpoint to get all food logs for a user
-            r = requests.get(f"{API_URL}/users/{self.user.get('user_id')}/foodlogs", headers=headers)
+            # Only fetch the selected day; the server serves it from the (user_id, date) index
+            selected_date = self.date_filter.date().toString("yyyy-MM-dd")
+            params = {"start": selected_date, "end": selected_date, "limit": 1000}
+            r = http.get(f"{API_URL}/users/{self.user.get('user_id')}/foodlogs", params=params, headers=headers)
             if r.status_code == 200:
                 self.food_logs = r.json()
+                self.load_daily_totals(selected_date, selected_date)
                 self.filter_food_logs()  # Apply initial filter
             elif r.status_code == 401:
                 QMessageBox.warning(self, "Authentication Error", "Not authenticated. Please log out and log in again.")
@@ -412,6 +427,31 @@ class ProgressWidget(QWidget):
             ]
             self.filter_food_logs()  # Apply initial filter
     
+    def load_daily_totals(self, start, end):
+        # Daily totals come from the server-side rollup, one row per day
+        try:
+            headers = {"Authorization": f"Bearer {self.token}"}
+            params = {"start": start, "end": end}
+            r = http.get(f"{API_URL}/users/{self.user.get('user_id')}/daily-totals", params=params, headers=headers)
+            if r.status_code == 200:
+                self.daily_totals = {row["date"]: row for row in r.json()}
+            else:
+                print(f"Error loading daily totals: {r.status_code}")
+        except Exception as e:
+            print(f"Error loading daily totals: {str(e)}")
+    
+    def get_daily_totals(self, selected_date, filtered_logs):
+        # Prefer the rollup; fall back to summing the logs we already have
+        totals = getattr(self, 'daily_totals', {}).get(selected_date)
+        if totals:
+            return totals
+        return {
+            "calories": sum(log.get("calories", 0) for log in filtered_logs),
+            "protein": sum(log.get("protein", 0) for log in filtered_logs),
+            "fat": sum(log.get("fat", 0) for log in filtered_logs),
+            "carbohydrates": sum(log.get("carbohydrates", 0) for log in filtered_logs)
+        }
+    
     def update_progress_table(self):
         if not hasattr(self, 'progress_data'):
             return
@@ -444,12 +484,6 @@ class ProgressWidget(QWidget):
             "Food", "Quantity", "Calories", "Protein (g)", "Fat (g)", "Carbs (g)"
         ])
         
-        # Calculate daily totals
-        total_calories = 0
-        total_protein = 0
-        total_fat = 0
-        total_carbs = 0
-        
         for i, log in enumerate(filtered_logs):
             self.food_log_table.setItem(i, 0, QTableWidgetItem(log.get("food_name", "")))
             self.food_log_table.setItem(i, 1, QTableWidgetItem(str(log.get("quantity", 0))))
@@ -457,27 +491,31 @@ class ProgressWidget(QWidget):
             self.food_log_table.setItem(i, 3, QTableWidgetItem(str(log.get("protein", 0))))
             self.food_log_table.setItem(i, 4, QTableWidgetItem(str(log.get("fat", 0))))
             self.food_log_table.setItem(i, 5, QTableWidgetItem(str(log.get("carbohydrates", 0))))
-            
-            # Add to totals
-            total_calories += log.get("calories", 0)
-            total_protein += log.get("protein", 0)
-            total_fat += log.get("fat", 0)
-            total_carbs += log.get("carbohydrates", 0)
         
         self.food_log_table.resizeColumnsToContents()
         
         # Update daily summary
         if filtered_logs:
+            totals = self.get_daily_totals(selected_date, filtered_logs)
             self.daily_summary.setText(
                 f"Daily Summary for {selected_date}: "
-                f"Calories: {total_calories} | "
-                f"Protein: {total_protein:.1f}g | "
-                f"Fat: {total_fat:.1f}g | "
-                f"Carbs: {total_carbs:.1f}g"
+                f"Calories: {totals['calories']} | "
+                f"Protein: {totals['protein']:.1f}g | "
+                f"Fat: {totals['fat']:.1f}g | "
+                f"Carbs: {totals['carbohydrates']:.1f}g"
             )
         else:
             self.daily_summary.setText(f"No food logs for {selected_date}")
     
+    @staticmethod
+    def chart_dates(iso_dates):
+        # A real date axis places ticks itself; string dates get one tick per point
+        return [datetime.date.fromisoformat(d) for d in iso_dates]
+    
+    @staticmethod
+    def line_style(color, dates):
+        return f'{color}-o' if len(dates) <= MAX_MARKED_POINTS else f'{color}-'
+    
     def update_chart(self):
         if not hasattr(self, 'progress_data') or not self.progress_data:
             # Create sample data for demonstration
@@ -487,8 +525,11 @@ class ProgressWidget(QWidget):
                 {"date": "2023-05-22", "weight": 74.5, "bmi": 24.3, "calorie_intake": 2000},
             ]
         
-        # Clear the axes
+        # Clear the axes, dropping the calorie axis the weekly chart adds
+        for extra_axes in self.canvas.fig.axes[1:]:
+            extra_axes.remove()
         self.canvas.axes.clear()
+        self.canvas.axes.patch.set_visible(True)
         
         # Get selected chart type
         chart_type = self.chart_selector.currentText()
@@ -498,7 +539,26 @@ class ProgressWidget(QWidget):
         
         dates = [entry.get("date", "") for entry in sorted_data]
         
-        if chart_type == "Weight Over Time":
+        analytics = self.analytics
+        
+        if chart_type == "Weight Over Time" and analytics and analytics["progress"]["date"]:
+            series = analytics["progress"]
+            series_dates = self.chart_dates(series["date"])
+            if "weight_min" in series:
+                # Range of the weigh-ins each downsampled point stands for
+                self.canvas.axes.fill_between(series_dates, series["weight_min"], series["weight_max"],
+                                              color='b', alpha=0.15, linewidth=0)
+            self.canvas.axes.plot(series_dates, series["weight"], self.line_style('b', series_dates), label='Weight')
+            self.canvas.axes.plot(series_dates, series["weight_rolling"], color='orange',
+                                  label=f'{analytics["window"]}-day average')
+            trend = analytics["trend"]
+            self.canvas.axes.plot(self.chart_dates(trend["date"]), trend["weight"],
+                                  color='gray', linestyle='--', label='Trend')
+            self.canvas.axes.set_ylabel('Weight (kg)')
+            self.canvas.axes.set_title(f'Weight Progress Over Time ({trend["kg_per_week"]:+.2f} kg/week)')
+            self.canvas.axes.legend()
+        
+        elif chart_type == "Weight Over Time":
             weights = [entry.get("weight", 0) for entry in sorted_data]
             self.canvas.axes.plot(dates, weights, 'b-o')
             self.canvas.axes.set_ylabel('Weight (kg)')
@@ -521,22 +581,56 @@ class ProgressWidget(QWidget):
             self.canvas.axes.text(dates[0], 27.5, "Overweight", color='r', alpha=0.7)
             self.canvas.axes.text(dates[0], 32.5, "Obese", color='r', alpha=0.7)
         
+        elif chart_type == "Calorie Intake Over Time" and analytics and analytics["calories"]["date"]:
+            # Every day with food logged, not only the days with a progress entry
+            series = analytics["calories"]
+            series_dates = self.chart_dates(series["date"])
+            if "calories_min" in series:
+                self.canvas.axes.fill_between(series_dates, series["calories_min"], series["calories_max"],
+                                              color='r', alpha=0.15, linewidth=0)
+            self.canvas.axes.plot(series_dates, series["calories"], self.line_style('r', series_dates), label='Calories')
+            self.canvas.axes.plot(series_dates, series["rolling"], color='orange',
+                                  label=f'{analytics["window"]}-day average')
+            self.canvas.axes.set_ylabel('Calories')
+            self.canvas.axes.set_title('Daily Calorie Intake Over Time')
+            self.canvas.axes.legend()
+        
         elif chart_type == "Calorie Intake Over Time":
             calories = [entry.get("calorie_intake", 0) for entry in sorted_data]
             self.canvas.axes.plot(dates, calories, 'r-o')
             self.canvas.axes.set_ylabel('Calories')
             self.canvas.axes.set_title('Daily Calorie Intake Over Time')
         
+        elif chart_type == "Weekly Averages":
+            if analytics and analytics["weekly"]["start"]:
+                weekly = analytics["weekly"]
+                week_dates = self.chart_dates(weekly["start"])
+                self.canvas.axes.plot(week_dates, weekly["weight"], self.line_style('b', week_dates))
+                self.canvas.axes.set_ylabel('Weight (kg)')
+                calorie_axes = self.canvas.axes.twinx()
+                # One stepped area rather than a bar per week keeps years of history cheap to draw
+                calorie_axes.fill_between(week_dates, [c or 0 for c in weekly["calories"]], step='post',
+                                          color='r', alpha=0.3, linewidth=0)
+                calorie_axes.set_ylabel('Calories per day')
+                self.canvas.axes.set_zorder(calorie_axes.get_zorder() + 1)
+                self.canvas.axes.patch.set_visible(False)
+                self.canvas.axes.set_title('Weekly Average Weight and Calories')
+            else:
+                self.canvas.axes.text(0.5, 0.5, 'Weekly averages are not available',
+                                     horizontalalignment='center', verticalalignment='center',
+                                     transform=self.canvas.axes.transAxes)
+        
         elif chart_type == "Macronutrient Distribution":
             # For this chart, we'll use the food log data from the current date
             if hasattr(self, 'food_logs') and self.food_logs:
                 selected_date = self.date_filter.date().toString("yyyy-MM-dd")
                 filtered_logs = [log for log in self.food_logs if log.get("date") == selected_date]
                 
-                # Calculate total macros
-                total_protein = sum(log.get("protein", 0) for log in filtered_logs)
-                total_fat = sum(log.get("fat", 0) for log in filtered_logs)
-                total_carbs = sum(log.get("carbohydrates", 0) for log in filtered_logs)
+                # Total macros for the day
+                totals = self.get_daily_totals(selected_date, filtered_logs)
+                total_protein = totals["protein"]
+                total_fat = totals["fat"]
+                total_carbs = totals["carbohydrates"]
                 
                 # Convert to calories (4 cal/g for protein and carbs, 9 cal/g for fat)
                 protein_cals = total_protein * 4
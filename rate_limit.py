@@ -0,0 +1,164 @@
+from fastapi import HTTPException, Request, status
+from typing import Dict, Hashable, Optional, Tuple
+import logging
+import math
+import os
+import time
+
+from cache import TTLCache
+from logging_setup import parse_settings
+
+logger = logging.getLogger(__name__)
+
+# Per-route budgets as route.key=requests/seconds, where key is ip, user or
+# email. A client may burst the full count at once and then gets a request
+# back every seconds/requests. RATE_LIMITS="login.email=10/60,register.ip=0"
+# overrides or, with 0, turns off single policies.
+DEFAULT_RATE_LIMITS = {
+    "login.ip": "20/60",
+    "login.email": "5/60",
+    "register.ip": "5/60",
+    "seed_foods.ip": "2/60",
+    "user_lookup.ip": "30/60",
+    "export.user": "5/60",
+}
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMITS = os.getenv("RATE_LIMITS", "")
+# Keys tracked per policy; the least recently seen are forgotten first
+RATE_LIMIT_KEYS = int(os.getenv("RATE_LIMIT_KEYS", "100000"))
+# Behind a single reverse proxy that appends X-Forwarded-For, key on the
+# address it saw rather than the proxy's own
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "0") == "1"
+
+# Requests in flight at once across the CPU-heavy routes (bcrypt, analytics,
+# fuzzy search); the rest are turned away instead of queueing
+CPU_ROUTE_CONCURRENCY = int(os.getenv("CPU_ROUTE_CONCURRENCY", "32"))
+CPU_ROUTE_RETRY_AFTER = int(os.getenv("CPU_ROUTE_RETRY_AFTER", "1"))
+
+def parse_rate(spec: str) -> Optional[Tuple[float, float]]:
+    # "20/60" -> (20 / 60 tokens per second, burst of 20); "0" -> no limit
+    count, _, seconds = spec.partition("/")
+    burst = float(count)
+    if burst <= 0:
+        return None
+    return burst / float(seconds or 1), burst
+
+def too_many_requests(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many requests, please retry later",
+        headers={"Retry-After": str(max(math.ceil(retry_after), 1))}
+    )
+
+class TokenBuckets(TTLCache):
+    """
+    A token bucket per key, holding up to burst tokens and refilled at rate
+    tokens per second. Each bucket is a (tokens, updated_at) pair brought up
+    to date when its key is seen, so a check is O(1). A bucket left idle
+    until full is the same as a new one, so entries expire after
+    burst / rate seconds.
+    """
+
+    def __init__(self, rate: float, burst: float, maxsize: int):
+        super().__init__(maxsize, ttl=burst / rate)
+        self.rate = rate
+        self.burst = burst
+        self.allowed = 0
+        self.limited = 0
+
+    def take(self, key: Hashable) -> float:
+        """Take a token for key. Returns 0, or the seconds until one is available."""
+        now = time.time()
+        bucket = self.get(key)
+        tokens = self.burst if bucket is None else min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        if tokens < 1:
+            self.limited += 1
+            return (1 - tokens) / self.rate
+        self.set(key, (tokens - 1, now))
+        self.allowed += 1
+        return 0.0
+
+class RateLimiter:
+    """Named TokenBuckets policies, checked from the endpoints."""
+
+    def __init__(self, policies: Dict[str, str], maxsize: int = RATE_LIMIT_KEYS, enabled: bool = RATE_LIMIT_ENABLED):
+        self.enabled = enabled
+        self.policies: Dict[str, TokenBuckets] = {}
+        for name, spec in policies.items():
+            rate = parse_rate(spec)
+            if rate is not None:
+                self.policies[name] = TokenBuckets(*rate, maxsize=maxsize)
+
+    def check(self, route: str, kind: str, key: Optional[Hashable]) -> None:
+        """Raise 429 with Retry-After once key has used up route's budget."""
+        buckets = self.policies.get(f"{route}.{kind}")
+        if not self.enabled or buckets is None or key is None:
+            return
+        retry_after = buckets.take(key)
+        if retry_after > 0:
+            logger.warning("Rate limit %s.%s exceeded by %s", route, kind, key)
+            raise too_many_requests(retry_after)
+
+    def stats(self) -> Dict[str, int]:
+        stats = {}
+        for name, buckets in self.policies.items():
+            stats[f"{name}.keys"] = len(buckets)
+            stats[f"{name}.allowed"] = buckets.allowed
+            stats[f"{name}.limited"] = buckets.limited
+            stats[f"{name}.evictions"] = buckets.evictions
+        return stats
+
+    def clear(self) -> None:
+        for buckets in self.policies.values():
+            buckets.clear()
+
+def client_ip(request: Request) -> Optional[str]:
+    if RATE_LIMIT_TRUST_PROXY:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            # The proxy appends the address it saw; anything before is client supplied
+            return forwarded.rsplit(",", 1)[-1].strip()
+    return request.client.host if request.client else None
+
+def limit_by_ip(route: str):
+    """Route dependency applying route's per-IP budget."""
+    async def check_ip(request: Request) -> None:
+        rate_limiter.check(route, "ip", client_ip(request))
+    return check_ip
+
+class ConcurrencyLimit:
+    """
+    Dependency admitting at most limit requests at once across the routes
+    that share it. Past that, requests get 429 straight away rather than
+    queueing behind work that is already saturating the CPU.
+    """
+
+    def __init__(self, limit: int = CPU_ROUTE_CONCURRENCY, retry_after: int = CPU_ROUTE_RETRY_AFTER):
+        self.limit = limit
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.rejected = 0
+
+    async def __call__(self):
+        if self.in_flight >= self.limit:
+            self.rejected += 1
+            logger.warning("CPU-bound routes at capacity (%s in flight), shedding request", self.in_flight)
+            raise too_many_requests(self.retry_after)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "rejected": self.rejected
+        }
+
+rate_limiter = RateLimiter({**DEFAULT_RATE_LIMITS, **parse_settings(RATE_LIMITS)})
+cpu_admission = ConcurrencyLimit()
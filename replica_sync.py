@@ -0,0 +1,34 @@
+from sqlalchemy import delete, insert, select
+from sqlalchemy.engine import Engine
+from typing import Dict
+import logging
+
+from models import Base
+from schema import migrate_connection
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 5000
+
+def copy_database(source: Engine, target: Engine, batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Overwrite every table in target with the rows in source and return the
+    rows copied per table. A stand-in for replication when trying out
+    DATABASE_REPLICA_URLS locally: it copies everything on each run, so it
+    only suits small databases. The target is replaced in one transaction,
+    so its readers see either the old copy or the new one, never a mix.
+    """
+    copied = {}
+    with source.connect() as reader, target.begin() as writer:
+        migrate_connection(writer)
+        # Children before parents, so foreign keys hold throughout
+        for table in reversed(Base.metadata.sorted_tables):
+            writer.execute(delete(table))
+        for table in Base.metadata.sorted_tables:
+            copied[table.name] = 0
+            result = reader.execution_options(yield_per=batch_size).execute(select(table))
+            for rows in result.mappings().partitions():
+                writer.execute(insert(table), [dict(row) for row in rows])
+                copied[table.name] += len(rows)
+    logger.info("Copied %s to replica", copied)
+    return copied
@@ -0,0 +1,156 @@
+from sqlalchemy import Date, Float, Integer, and_, func, insert, literal, or_, select, update
+from sqlalchemy.orm import Session
+from datetime import date
+from typing import Optional, List, Dict, Any, Iterable
+
+from models import DailyNutrition, Progress
+from db_utils import upsert_increment_stmt
+from partitions import archive_cutoff_select, with_archive
+
+NUTRITION_COLUMNS = ("calories", "protein", "fat", "carbohydrates")
+
+def daily_nutrition_deltas(food_logs: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Collapse food log rows into one delta per (user_id, date)
+    deltas = {}
+    for log in food_logs:
+        key = (log["user_id"], log["date"])
+        delta = deltas.get(key)
+        if delta is None:
+            delta = deltas[key] = {
+                "user_id": log["user_id"],
+                "date": log["date"],
+                "calories": 0,
+                "protein": 0.0,
+                "fat": 0.0,
+                "carbohydrates": 0.0,
+                "entry_count": 0
+            }
+        for col in NUTRITION_COLUMNS:
+            delta[col] += log[col]
+        delta["entry_count"] += 1
+    return list(deltas.values())
+
+def bump_daily_nutrition_stmt(dialect_name: str, food_logs: Iterable[Dict[str, Any]]):
+    """
+    Upsert adding the given food logs to their daily_nutrition rows.
+    Execute it in the same transaction as the food log insert.
+    """
+    return upsert_increment_stmt(
+        dialect_name,
+        DailyNutrition.__table__,
+        daily_nutrition_deltas(food_logs),
+        key_columns=("user_id", "date"),
+        increment_columns=NUTRITION_COLUMNS + ("entry_count",)
+    )
+
+def bump_daily_nutrition(db: Session, food_logs: Iterable[Dict[str, Any]]) -> None:
+    db.execute(bump_daily_nutrition_stmt(db.get_bind().dialect.name, food_logs))
+
+def progress_intake_update(where=None):
+    """
+    UPDATE setting progress.calorie_intake to the calories logged that day,
+    0 for a day without food logs. Each row looks up one daily_nutrition
+    primary key.
+    """
+    day_calories = select(DailyNutrition.calories).where(
+        DailyNutrition.user_id == Progress.user_id,
+        DailyNutrition.date == Progress.date
+    ).scalar_subquery()
+    stmt = update(Progress).values(calorie_intake=func.coalesce(day_calories, 0))
+    return stmt.where(where) if where is not None else stmt
+
+def refresh_progress_intake_stmt(food_logs: Iterable[Dict[str, Any]]):
+    """
+    Re-derive calorie_intake for progress entries on the days the given food
+    logs landed on. Execute it after bump_daily_nutrition_stmt, in the same
+    transaction, so a log added for a past day corrects that day's entry.
+    """
+    days = {}
+    for log in food_logs:
+        days.setdefault(log["user_id"], set()).add(log["date"])
+    return progress_intake_update(or_(*(
+        and_(Progress.user_id == user_id, Progress.date.in_(sorted(dates)))
+        for user_id, dates in days.items()
+    )))
+
+def refresh_progress_intake(db: Session, food_logs: Iterable[Dict[str, Any]]) -> None:
+    db.execute(refresh_progress_intake_stmt(food_logs))
+
+def day_calories_query(user_id: int, day: date):
+    # Calories logged on one day, the calorie_intake of a new progress entry
+    return select(DailyNutrition.calories).where(DailyNutrition.user_id == user_id, DailyNutrition.date == day)
+
+def insert_progress_stmt(progress):
+    """
+    INSERT ... SELECT of a progress entry with calorie_intake read from
+    daily_nutrition in the same statement.
+    """
+    return insert(Progress).from_select(
+        ["user_id", "date", "weight", "bmi", "calorie_intake"],
+        select(
+            literal(progress.user_id, Integer),
+            literal(progress.date, Date),
+            literal(progress.weight, Float),
+            literal(progress.bmi, Float),
+            func.coalesce(day_calories_query(progress.user_id, progress.date).scalar_subquery(), 0)
+        )
+    )
+
+def daily_totals_query(user_id: int, start: Optional[date] = None, end: Optional[date] = None):
+    query = DailyNutrition.__table__.select().where(DailyNutrition.user_id == user_id)
+    if start is not None:
+        query = query.where(DailyNutrition.date >= start)
+    if end is not None:
+        query = query.where(DailyNutrition.date <= end)
+    return query.order_by(DailyNutrition.date)
+
+def get_daily_totals(db: Session, user_id: int, start: Optional[date] = None, end: Optional[date] = None) -> List[Dict[str, Any]]:
+    return [dict(row) for row in db.execute(daily_totals_query(user_id, start, end)).mappings()]
+
+def rebuild_daily_nutrition(db: Session, user_id: Optional[int] = None) -> int:
+    """
+    Recompute daily_nutrition from food_logs, for one user or everyone, and
+    the progress calorie intake derived from it. Repairs any drift between
+    the rollup and the raw log rows.
+    """
+    # Archived food logs count too; they still belong to their days
+    archived_before = db.execute(archive_cutoff_select()).scalar()
+
+    def from_table(table):
+        query = select(
+            table.c.foodlog_id, table.c.user_id, table.c.date,
+            table.c.calories, table.c.protein, table.c.fat, table.c.carbohydrates
+        )
+        return query.where(table.c.user_id == user_id) if user_id is not None else query
+
+    logs = with_archive(from_table, archived_before).subquery()
+    aggregate = select(
+        logs.c.user_id,
+        logs.c.date,
+        func.sum(logs.c.calories),
+        func.sum(logs.c.protein),
+        func.sum(logs.c.fat),
+        func.sum(logs.c.carbohydrates),
+        func.count(logs.c.foodlog_id)
+    ).group_by(logs.c.user_id, logs.c.date)
+
+    delete = DailyNutrition.__table__.delete()
+    intake = progress_intake_update()
+    if user_id is not None:
+        delete = delete.where(DailyNutrition.user_id == user_id)
+        intake = progress_intake_update(Progress.user_id == user_id)
+
+    try:
+        db.execute(delete)
+        result = db.execute(
+            insert(DailyNutrition).from_select(
+                ["user_id", "date", "calories", "protein", "fat", "carbohydrates", "entry_count"],
+                aggregate
+            )
+        )
+        db.execute(intake)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return result.rowcount
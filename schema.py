@@ -0,0 +1,46 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import Connection, make_url
+import logging
+
+from models import Base, get_engine
+from models.base import DATABASE_URL
+from food_import import ensure_name_keys
+
+logger = logging.getLogger(__name__)
+
+def create_database_if_not_exists(url: str = DATABASE_URL) -> None:
+    # MySQL needs the database itself to exist before create_all can run
+    db_url = make_url(url)
+    if db_url.get_backend_name() != "mysql" or not db_url.database:
+        return
+    server = create_engine(db_url.set(database=None))
+    try:
+        with server.connect() as conn:
+            conn.execute(text(f"CREATE DATABASE IF NOT EXISTS `{db_url.database}`"))
+        logger.info("Database %s checked/created", db_url.database)
+    finally:
+        server.dispose()
+
+def ensure_indexes(conn: Connection) -> None:
+    # create_all skips tables that already exist, and with them any index
+    # declared after the table was first created
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspect(conn).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                logger.info("Creating index %s", index.name)
+                index.create(conn)
+
+def migrate_connection(conn: Connection) -> None:
+    """
+    Create missing tables and bring older ones up to date. Safe to run
+    repeatedly; used by `manage.py migrate` and the API startup hook.
+    """
+    Base.metadata.create_all(conn)
+    ensure_name_keys(conn)
+    ensure_indexes(conn)
+
+def migrate() -> None:
+    create_database_if_not_exists()
+    with get_engine().begin() as conn:
+        migrate_connection(conn)
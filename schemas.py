@@ -59,15 +59,38 @@ class FoodLogResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class FoodLogDetailResponse(FoodLogResponse):
+    food_name: Optional[str] = None
+
+class DailyNutritionResponse(BaseModel):
+    user_id: int
+    date: date
+    calories: int
+    protein: float
+    fat: float
+    carbohydrates: float
+    entry_count: int
+    # Range of calories over the bucket a row stands for, with ?points=
+    calories_min: Optional[int] = None
+    calories_max: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
 class ProgressCreate(BaseModel):
     user_id: int
     weight: float
     bmi: float
-    calorie_intake: int
+    # Ignored if sent: the server derives it from that day's food logs
+    calorie_intake: Optional[int] = None
     date: date
 
 class ProgressResponse(ProgressCreate):
     progress_id: int
+    calorie_intake: int
+    # Range of weight over the bucket a row stands for, with ?points=
+    weight_min: Optional[float] = None
+    weight_max: Optional[float] = None
 
     class Config:
         from_attributes = True
@@ -0,0 +1,123 @@
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+import logging
+import os
+import re
+
+from metrics import on_statement
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("sql.slow")
+
+# Off by default; SQL_PROFILER_ENABLED=1 attributes every statement to its request
+SQL_PROFILER_ENABLED = os.getenv("SQL_PROFILER_ENABLED", "0") == "1"
+# Statements slower than this go to the sql.slow logger
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+# The same statement shape this many times in one request looks like N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+# Bound on distinct statements whose shape is memoized
+MAX_SHAPES = 2000
+
+# Expanded IN lists and multi-row VALUES differ only in how many placeholders
+# they carry; collapse them so they count as one shape
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)")
+_VALUES_ROWS = re.compile(r"(VALUES \(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+")
+_WHITESPACE = re.compile(r"\s+")
+
+_shapes: Dict[str, str] = {}
+
+def statement_shape(statement: str) -> str:
+    shape = _shapes.get(statement)
+    if shape is None:
+        shape = _WHITESPACE.sub(" ", statement).strip()
+        shape = _PLACEHOLDER_LIST.sub("(...)", shape)
+        shape = _VALUES_ROWS.sub(r"\1", shape)
+        if len(_shapes) >= MAX_SHAPES:
+            _shapes.clear()
+        _shapes[statement] = shape
+    return shape
+
+def parameters_shape(parameters: Any, executemany: bool) -> str:
+    # Types only: values may be emails or password hashes
+    if executemany:
+        rows = list(parameters)
+        return f"{len(rows)} x {parameters_shape(rows[0], False)}" if rows else "0 rows"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+class RequestProfile:
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.statements = 0
+        self.seconds = 0.0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, parameters: Any, executemany: bool, seconds: float) -> None:
+        self.statements += 1
+        self.seconds += seconds
+        shape = statement_shape(statement)
+        self.shapes[shape] += 1
+        # Every statement passes through here; describe the parameters only
+        # when the line will be logged
+        if seconds * 1000 >= SLOW_QUERY_MS and slow_query_logger.isEnabledFor(logging.WARNING):
+            slow_query_logger.warning(
+                "%.1fms %s %s: %s params %s",
+                seconds * 1000, self.method, self.path, shape, parameters_shape(parameters, executemany)
+            )
+
+    def report(self) -> None:
+        for shape, count in self.shapes.items():
+            if count >= N_PLUS_ONE_THRESHOLD:
+                logger.warning("Possible N+1 in %s %s: %d x %s", self.method, self.path, count, shape)
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.seconds * 1000:.2f};desc="{self.statements} queries"'
+
+_request_profile: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+def _record_statement(statement, parameters, executemany, seconds):
+    profile = _request_profile.get()
+    if profile is not None:
+        profile.record(statement, parameters, executemany, seconds)
+
+if SQL_PROFILER_ENABLED:
+    # Shares the metrics module's statement timing rather than adding hooks
+    on_statement(_record_statement)
+
+class SQLProfilerMiddleware:
+    """
+    Attributes every statement to the HTTP request that ran it. Adds a
+    Server-Timing header with the database time spent before the response
+    started, logs slow statements, and warns once per request about
+    statement shapes repeated N_PLUS_ONE_THRESHOLD times or more.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", profile.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _request_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_profile.reset(token)
+            profile.report()
@@ -0,0 +1,91 @@
+import datetime
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import downsample_rows, envelope, lttb
+
+def reference_buckets(size, points):
+    # The first and last samples stand alone; the rest split into points - 2
+    # buckets with the same edges lttb() uses
+    edges = np.linspace(1, size - 1, points - 1).astype(np.int64)
+    return [(int(edges[i]), int(edges[i + 1])) for i in range(points - 2)]
+
+def reference_lttb(x, y, points):
+    size = len(x)
+    if points >= size or points < 3:
+        return list(range(size))
+    buckets = reference_buckets(size, points)
+    kept = [0]
+    for i, (start, end) in enumerate(buckets):
+        if i + 1 < len(buckets):
+            next_start, next_end = buckets[i + 1]
+            bx = sum(x[next_start:next_end]) / (next_end - next_start)
+            by = sum(y[next_start:next_end]) / (next_end - next_start)
+        else:
+            bx, by = x[-1], y[-1]
+        ax, ay = x[kept[-1]], y[kept[-1]]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - bx) * (y[j] - ay) - (ax - x[j]) * (by - ay))
+            if area > best_area:
+                best, best_area = j, area
+        kept.append(best)
+    kept.append(size - 1)
+    return kept
+
+def reference_envelope(y, points):
+    if points >= len(y) or points < 3:
+        return list(y), list(y)
+    buckets = reference_buckets(len(y), points)
+    lows = [y[0]] + [min(y[start:end]) for start, end in buckets] + [y[-1]]
+    highs = [y[0]] + [max(y[start:end]) for start, end in buckets] + [y[-1]]
+    return lows, highs
+
+def test_lttb_last_bucket_mean_excludes_last_sample():
+    x = np.arange(10, dtype=np.float64)
+    y = np.array([0, 5, 0, 5, 0, 5, 9, 0, 1, 0], dtype=np.float64)
+    assert lttb(x, y, 5).tolist() == reference_lttb(x.tolist(), y.tolist(), 5)
+
+@pytest.mark.parametrize("seed", range(200))
+def test_lttb_matches_reference(seed):
+    rng = np.random.default_rng(seed)
+    size = int(rng.integers(3, 300))
+    points = int(rng.integers(3, size + 2))
+    x = np.cumsum(rng.integers(1, 4, size)).astype(np.float64)
+    y = rng.normal(70, 5, size)
+    assert lttb(x, y, points).tolist() == reference_lttb(x.tolist(), y.tolist(), points)
+
+@pytest.mark.parametrize("seed", range(200))
+def test_envelope_matches_reference(seed):
+    rng = np.random.default_rng(seed)
+    size = int(rng.integers(3, 300))
+    points = int(rng.integers(3, size + 2))
+    y = rng.normal(2000, 400, size)
+    lows, highs = envelope(y, points)
+    expected_lows, expected_highs = reference_envelope(y.tolist(), points)
+    assert lows.tolist() == expected_lows
+    assert highs.tolist() == expected_highs
+
+@pytest.mark.parametrize("seed", range(20))
+def test_downsample_rows_carry_bucket_envelope(seed):
+    rng = np.random.default_rng(seed)
+    size = int(rng.integers(10, 200))
+    points = int(rng.integers(3, size))
+    start = datetime.date(2024, 1, 1)
+    rows = [
+        {"date": start + datetime.timedelta(days=day), "calories": int(calories)}
+        for day, calories in zip(np.cumsum(rng.integers(1, 4, size)).tolist(), rng.integers(1200, 3500, size))
+    ]
+    kept = downsample_rows(rows, "calories", points)
+    x = np.array([row["date"] for row in rows], dtype="datetime64[D]").astype(np.float64)
+    y = np.array([row["calories"] for row in rows], dtype=np.float64)
+    lows, highs = reference_envelope([row["calories"] for row in rows], points)
+    assert [row["date"] for row in kept] == [rows[index]["date"] for index in lttb(x, y, points).tolist()]
+    assert [row["calories_min"] for row in kept] == lows
+    assert [row["calories_max"] for row in kept] == highs
+    assert all(row["calories_min"] <= row["calories"] <= row["calories_max"] for row in kept)
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from statement_counts import BUDGETS, measure_endpoints
+
+@pytest.fixture(scope="module")
+def measured():
+    return measure_endpoints()
+
+@pytest.mark.parametrize("endpoint", BUDGETS)
+def test_write_endpoint_within_round_trip_budget(measured, endpoint):
+    response, statements, budget = measured[endpoint]
+    assert response.status_code < 400, response.text
+    assert len(statements) <= budget, "\n".join(statements)